@@ -4,7 +4,7 @@
 import os
 import logging
 import sys
-from typing import List
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -48,18 +48,104 @@ class Settings(BaseSettings):
     openrouter_base_url: str = "https://openrouter.ai/api/v1"
     openai_model: str = os.getenv("OPENAI_MODEL", "google/gemini-2.5-flash-lite-preview-09-2025")
     openai_vision_model: str = os.getenv("OPENAI_VISION_MODEL", "google/gemini-3-pro-image-preview")
+    openai_timeout: float = 60.0  # Таймаут одного вызова модели (сек)
+    openai_connect_timeout: float = 10.0
+    openai_max_concurrency: int = 32  # Максимум одновременных вызовов модели
+    openai_max_connections: int = 64  # Размер пула HTTP соединений
+    openai_rpm_limit: int = 0  # Запросов к модели в минуту (0 - без лимита)
+    openai_tpm_limit: int = 0  # Токенов в минуту (0 - без лимита), учёт по usage ответов
+    openai_image_token_estimate: int = 1500  # Оценка токенов на изображение до ответа
+    openai_completion_token_estimate: int = 1000  # Оценка токенов ответа без max_tokens
+    openai_max_retries: int = 3  # Повторов при 429/5xx/сетевых ошибках
+    openai_retry_base_delay: float = 0.5  # Базовая пауза экспоненциального отката (сек)
+    openai_retry_max_delay: float = 20.0  # Максимальная пауза; больший Retry-After - без повтора
+    openai_breaker_failure_threshold: int = 5  # Сбоев подряд до размыкания выключателя
+    openai_breaker_reset_timeout: float = 30.0  # Сколько отклонять вызовы после размыкания (сек)
     
     # API
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     
+    # Подготовка изображений для Vision модели
+    image_max_edge: int = 1568  # Максимальная сторона после уменьшения (px)
+    image_output_format: str = "jpeg"  # "jpeg" или "webp"
+    image_quality: int = 80
+    
+    # Кэш результатов анализа
+    analysis_cache_backend: str = "memory"  # "memory", "disk" или "none"
+    analysis_cache_dir: str = ".cache/analysis"
+    analysis_cache_ttl: int = 7 * 24 * 3600  # Время жизни записи (сек)
+    analysis_cache_max_items: int = 1000
+    
     # История
-    history_file: str = "history.json"
-    max_history_items: int = 10
+    history_db: str = "history.db"  # SQLite база истории
+    history_file: str = "history.json"  # Старый формат, переносится в базу при первом запуске
+    max_history_items: int = 10  # Записей в ответе /history
+    history_max_stored: int = 500000  # Сколько записей хранить в базе
+    history_retention_days: int = 365  # Удалять записи старше N дней (0 - не удалять)
     
     # Парсер
     parser_timeout: int = 10
     parser_user_agent: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    chromedriver_path: str = os.getenv("CHROMEDRIVER_PATH", "")  # Локальный chromedriver (без сети)
+    chromedriver_auto_install: bool = False  # Разрешить загрузку через webdriver-manager (нужна сеть)
+    parser_pool_size: int = 2  # Количество долгоживущих Chrome драйверов
+    parser_driver_max_uses: int = 50  # Пересоздать драйвер после N страниц
+    parser_pool_acquire_timeout: float = 60.0  # Ожидание свободного драйвера (сек)
+    parser_ready_max_wait: float = 8.0  # Максимум ожидания стабилизации страницы (сек)
+    parser_ready_quiet_period: float = 0.5  # Страница готова, если DOM и сеть не менялись N сек
+    parser_ready_poll_interval: float = 0.1
+    parser_per_host_concurrency: int = 1  # Одновременных загрузок одного хоста
+    parser_host_min_delay: float = 1.0  # Минимальная пауза между загрузками одного хоста (сек)
+    parser_respect_robots: bool = True  # Учитывать Crawl-delay и Disallow из robots.txt
+    parser_robots_ttl: int = 6 * 3600  # Сколько хранить загруженный robots.txt (сек)
+    parser_robots_timeout: float = 5.0
+    parser_max_crawl_delay: float = 30.0  # Верхняя граница Crawl-delay из robots.txt (сек)
+    # Извлекаемые поля: title, h1, paragraphs, meta_description, og, prices
+    parser_extract_fields: List[str] = ["title", "h1", "paragraphs", "meta_description", "og", "prices"]
+    parser_max_paragraphs: int = 5  # Абзацев-кандидатов (длиннее 50 символов)
+    parser_max_prices: int = 10  # Найденных цен на странице
+    parser_http_fast_path: bool = True  # Без скриншота сначала пробовать HTTP без браузера
+    parser_http_timeout: float = 10.0
+    parser_http_max_connections: int = 32
+    parser_http_max_bytes: int = 3_000_000  # Читать не больше N байт HTML
+    parser_http_min_text_length: int = 200  # Меньше текста - страница рендерится скриптами, нужен Chrome
+    
+    # Обход нескольких страниц сайта (цены, бронирование, домики, SPA)
+    # Страницы по HTTP подчиняются лимитам хоста (по умолчанию по одной с паузой parser_host_min_delay)
+    parser_crawl_max_pages: int = 5  # Страниц по умолчанию, включая стартовую
+    parser_crawl_max_pages_limit: int = 20  # Верхняя граница max_pages в запросе
+    parser_crawl_max_links: int = 200  # Ссылок стартовой страницы для выбора
+    parser_crawl_max_text_chars: int = 6000  # Общий текст страниц для анализа (символов)
+    
+    # Сбор данных конкурентов
+    collector_max_concurrency: int = 8  # Сайтов в обработке одновременно (парсинг + AI)
+    collector_crawl_pages: int = 1  # Страниц каждого сайта при сборе (1 - только стартовая)
+    incremental_analysis: bool = True  # Не анализировать повторно неизменившиеся сайты
+    fingerprint_max_distance: int = 3  # Допустимое отличие скриншота (бит перцептивного хэша из 256)
+    
+    # Пакетная обработка
+    batch_max_items: int = 1000  # Элементов в одном пакетном запросе
+    batch_max_concurrency: int = 8  # Элементов пакета в обработке одновременно
+    batch_max_image_bytes: int = 20 * 1024 * 1024  # Максимальный размер одного файла
+    batch_spool_dir: str = ""  # Каталог временных файлов загрузок (пусто - системный)
+    
+    # Планировщик сбора (вместо внешнего cron)
+    scheduler_enabled: bool = False
+    scheduler_interval: float = 3600.0  # Интервал сбора по умолчанию (сек)
+    scheduler_jitter: float = 0.1  # Случайный разброс запуска (доля интервала)
+    # Группы URL: [{"name": "main", "urls": [...], "interval": 3600, "jitter": 0.1}]; пусто - одна группа со всеми конкурентами
+    scheduler_groups: List[Dict[str, Any]] = []
+    scheduler_max_runs: int = 5000  # Сколько записей о запусках хранить
+    
+    # Трассировка
+    tracing_enabled: bool = True  # Спаны этапов запроса, заголовки X-Request-ID и traceparent
+    tracing_export_path: str = ""  # Файл JSON Lines для завершённых спанов (пусто - не сохранять)
+    
+    # Фоновые задачи
+    jobs_max_workers: int = 4  # Задач, выполняемых одновременно
+    jobs_max_retained: int = 500  # Сколько завершённых задач хранить в памяти
+    jobs_max_pending: int = 1000  # Незавершённых задач (в очереди и в работе), сверх - 429
     competitor_urls: List[str] = [
     "https://kitovybereg.ru",
     "https://altay.lesimore.com",
@@ -2,34 +2,68 @@
 Главный модуль FastAPI приложения
 Мониторинг конкурентов - MVP ассистент
 """
-import base64
+import re
 import time
+import uuid
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 import uvicorn
 
 from backend.config import settings
 from backend.models.schemas import (
     TextAnalysisRequest,
     TextAnalysisResponse,
+    BatchTextAnalysisRequest,
+    BatchTextAnalysisResponse,
+    BatchImageAnalysisResponse,
     ImageAnalysisResponse,
     ParseDemoRequest,
     ParseDemoResponse,
     CompetitorCollectionResponse,
+    CollectionStreamEvent,
     ParsedContent,
-    HistoryResponse
+    HistoryResponse,
+    HistoryDetail,
+    HistorySearchResponse,
+    JobInfo,
+    JobListResponse,
+    Competitor,
+    CompetitorCreate,
+    CompetitorUpdate,
+    CompetitorListResponse,
+    SchedulerRun,
+    SchedulerRunListResponse,
+    SchedulerStatusResponse
 )
 from backend.services.openai_service import openai_service
 from backend.services.parser_service import parser_service
 from backend.services.history_service import history_service
+from backend.services.collector_service import collector_service
+from backend.services.job_service import job_service, JobQueueFullError
+from backend.services.scheduler_service import scheduler_service
+from backend.services.competitor_service import competitor_service, CompetitorExistsError
+from backend.services.cache_service import analysis_cache
+from backend.services.image_service import image_service
+from backend.services.fingerprint_service import fingerprint_service
+from backend.services.batch_service import batch_service, SpooledImage
+from backend.services.metrics import metrics, http_request_duration
+from backend.services.tracing import tracer, request_id_var
 
 # Логгер для API
 logger = logging.getLogger("competitor_monitor.api")
 
+# Допустимый X-Request-ID от клиента; иначе генерируется свой
+REQUEST_ID_RE = re.compile(r"^[\w\-.]{1,128}$")
+
+# Поддерживаемые типы изображений
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/gif", "image/webp"]
+
 # Инициализация приложения
 logger.info("=" * 60)
 logger.info("🚀 ЗАПУСК ПРИЛОЖЕНИЯ: Мониторинг конкурентов")
@@ -48,11 +82,24 @@ app = FastAPI(
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Запуск приложения...")
+    await parser_service.warmup()
+    job_service.start()
+    scheduler_service.start()
     yield
     # Shutdown
     logger.info("🔴 Остановка сервера...")
+    logger.info("  Остановка фоновых задач...")
+    await scheduler_service.stop()
+    await job_service.stop()
     logger.info("  Закрытие Parser сервиса...")
     await parser_service.close()
+    history_service.close()
+    fingerprint_service.close()
+    scheduler_service.close()
+    competitor_service.close()
+    logger.info("  Закрытие OpenAI сервиса...")
+    await openai_service.close()
+    tracer.close()
     logger.info("  ✓ Все ресурсы освобождены")
 
 app = FastAPI(
@@ -80,22 +127,83 @@ logger.info("CORS middleware добавлен ✓")
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Логирование всех HTTP запросов"""
+    """Логирование всех HTTP запросов, метрики и корневой спан трассировки"""
     start_time = time.time()
     
+    # Id запроса: от клиента (X-Request-ID) или новый; виден во всех спанах запроса
+    request_id = request.headers.get("x-request-id", "")
+    if not REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex
+    request_id_var.set(request_id)
+    trace_id, parent_id = tracer.parse_traceparent(request.headers.get("traceparent"))
+    
     # Логируем входящий запрос
-    logger.info(f"➡️  {request.method} {request.url.path}")
+    logger.info(f"➡️  {request.method} {request.url.path} [{request_id}]")
     if request.query_params:
         logger.debug(f"    Query params: {dict(request.query_params)}")
     
     # Выполняем запрос
-    response = await call_next(request)
+    with tracer.span(
+        f"{request.method} {request.url.path}", trace_id=trace_id, parent_id=parent_id,
+        **{"http.method": request.method, "http.target": request.url.path}
+    ) as span:
+        try:
+            response = await call_next(request)
+        except Exception:
+            # Необработанная ошибка: клиент получит 500, спан помечен ошибкой
+            elapsed = time.time() - start_time
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(elapsed, method=request.method, route=route, status="500")
+            if span:
+                span.name = f"{request.method} {route}"
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", 500)
+            logger.error(f"❌ {request.method} {request.url.path} -> 500 ({elapsed:.3f}s)")
+            raise
+        
+        # В метриках и спане - шаблон маршрута, а не конкретный путь
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        if span:
+            # Спан и замер заканчиваются после отправки тела: потоковые ответы
+            # (/collect_competitors/stream) длятся дольше, чем отдача заголовков
+            span.deferred = True
+            span.name = f"{request.method} {route}"
+            span.set_attribute("http.route", route)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = "ERROR"
+            response.headers["traceparent"] = span.traceparent
+    
+    response.headers["X-Request-ID"] = request_id
+    
+    def finish():
+        # Логируем ответ после отправки тела
+        elapsed = time.time() - start_time
+        http_request_duration.observe(
+            elapsed,
+            method=request.method,
+            route=route,
+            status=str(response.status_code)
+        )
+        if span:
+            tracer.end(span)
+        status_emoji = "✅" if response.status_code < 400 else "❌"
+        logger.info(f"{status_emoji} {request.method} {request.url.path} -> {response.status_code} ({elapsed:.3f}s)")
     
-    # Логируем ответ
-    elapsed = time.time() - start_time
-    status_emoji = "✅" if response.status_code < 400 else "❌"
-    logger.info(f"{status_emoji} {request.method} {request.url.path} -> {response.status_code} ({elapsed:.3f}s)")
+    body_iterator = response.body_iterator
     
+    async def body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        except BaseException as e:
+            if span:
+                span.set_error(e)
+            raise
+        finally:
+            finish()
+    
+    response.body_iterator = body()
     return response
 
 
@@ -156,7 +264,8 @@ async def analyze_text(request: TextAnalysisRequest):
         history_service.add_entry(
             request_type="text",
             request_summary=request.text[:100] + "..." if len(request.text) > 100 else request.text,
-            response_summary=analysis.summary
+            response_summary=analysis.summary,
+            analysis=analysis
         )
         
         logger.info("  ✅ УСПЕХ: Анализ текста завершён")
@@ -175,6 +284,44 @@ async def analyze_text(request: TextAnalysisRequest):
         )
 
 
+@app.post("/analyze_text/batch", response_model=BatchTextAnalysisResponse)
+async def analyze_text_batch(request: BatchTextAnalysisRequest):
+    """
+    Пакетный анализ текстов: одинаковые тексты анализируются один раз,
+    ошибка одного текста не прерывает пакет, результаты в порядке входа
+    """
+    logger.info("=" * 50)
+    logger.info(f"📦 API: ПАКЕТНЫЙ АНАЛИЗ ТЕКСТОВ ({len(request.texts)} шт.)")
+    
+    if len(request.texts) > batch_service.max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много элементов: {len(request.texts)}, максимум {batch_service.max_items}"
+        )
+    
+    try:
+        start_time = time.time()
+        results = await batch_service.analyze_texts(request.texts)
+        succeeded = sum(1 for item in results if item.success)
+        
+        return BatchTextAnalysisResponse(
+            success=True,
+            results=results,
+            total=len(results),
+            unique=sum(1 for item in results if item.duplicate_of is None),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            elapsed=round(time.time() - start_time, 3)
+        )
+    except Exception as e:
+        logger.error(f"  ❌ ОШИБКА: {e}")
+        logger.error("=" * 50)
+        return BatchTextAnalysisResponse(
+            success=False,
+            error=str(e)
+        )
+
+
 @app.post("/analyze_image", response_model=ImageAnalysisResponse)
 async def analyze_image(file: UploadFile = File(...)):
     """
@@ -186,32 +333,37 @@ async def analyze_image(file: UploadFile = File(...)):
     logger.info(f"  Тип: {file.content_type}")
     
     # Проверяем тип файла
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
         logger.warning(f"  ⚠ Неподдерживаемый тип файла: {file.content_type}")
         logger.info("=" * 50)
         raise HTTPException(
             status_code=400,
-            detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(allowed_types)}"
+            detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(ALLOWED_IMAGE_TYPES)}"
         )
     
+    logger.info("  📥 Чтение файла...")
+    content = await file.read()
+    
+    return await _analyze_image_content(content, file.filename, file.content_type)
+
+
+async def _analyze_image_content(content: bytes, filename: str, content_type: str) -> ImageAnalysisResponse:
+    """Анализ уже прочитанного изображения (общая часть для API и фоновых задач)"""
     try:
         start_time = time.time()
         
-        # Читаем и кодируем изображение
-        logger.info("  📥 Чтение файла...")
-        content = await file.read()
+        # Уменьшаем, пережимаем и кодируем изображение
         file_size_kb = len(content) / 1024
         logger.info(f"  Размер файла: {file_size_kb:.1f} KB")
         
-        image_base64 = base64.b64encode(content).decode('utf-8')
-        logger.info(f"  Base64 размер: {len(image_base64)} символов")
+        image_base64, image_mime = await image_service.encode(content, content_type)
+        logger.info(f"  Base64 размер: {len(image_base64)} символов ({image_mime})")
         
         # Анализируем
         logger.info("  🔍 Отправка на анализ...")
         analysis = await openai_service.analyze_image(
             image_base64=image_base64,
-            mime_type=file.content_type
+            mime_type=image_mime
         )
         
         elapsed = time.time() - start_time
@@ -221,8 +373,9 @@ async def analyze_image(file: UploadFile = File(...)):
         logger.info("  💾 Сохранение в историю...")
         history_service.add_entry(
             request_type="image",
-            request_summary=f"Изображение: {file.filename}",
-            response_summary=analysis.description[:200] if analysis.description else "Анализ изображения"
+            request_summary=f"Изображение: {filename}",
+            response_summary=analysis.description[:200] if analysis.description else "Анализ изображения",
+            analysis=analysis
         )
         
         logger.info("  ✅ УСПЕХ: Анализ изображения завершён")
@@ -241,6 +394,68 @@ async def analyze_image(file: UploadFile = File(...)):
         )
 
 
+async def _spool_images(files: List[UploadFile]) -> List[SpooledImage]:
+    """Сохранить загрузки во временные файлы; неподдерживаемые типы - ошибка элемента"""
+    if len(files) > batch_service.max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много файлов: {len(files)}, максимум {batch_service.max_items}"
+        )
+    
+    images = []
+    for index, file in enumerate(files):
+        if file.content_type not in ALLOWED_IMAGE_TYPES:
+            await file.close()
+            images.append(SpooledImage(
+                index=index,
+                filename=file.filename,
+                content_type=file.content_type,
+                error=f"Неподдерживаемый тип файла. Разрешены: {', '.join(ALLOWED_IMAGE_TYPES)}"
+            ))
+        else:
+            images.append(await batch_service.spool_upload(index, file))
+    return images
+
+
+async def _analyze_spooled_images(images: List[SpooledImage]) -> BatchImageAnalysisResponse:
+    """Пакетный анализ сохранённых файлов (общая часть для API и фоновых задач)"""
+    try:
+        start_time = time.time()
+        results = await batch_service.analyze_images(images)
+        succeeded = sum(1 for item in results if item.success)
+        
+        return BatchImageAnalysisResponse(
+            success=True,
+            results=results,
+            total=len(results),
+            unique=len({image.sha256 for image in images if not image.error}),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            elapsed=round(time.time() - start_time, 3)
+        )
+    except Exception as e:
+        batch_service.cleanup(images)
+        logger.error(f"  ❌ ОШИБКА: {e}")
+        logger.error("=" * 50)
+        return BatchImageAnalysisResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+@app.post("/analyze_image/batch", response_model=BatchImageAnalysisResponse)
+async def analyze_image_batch(files: List[UploadFile] = File(...)):
+    """
+    Пакетный анализ изображений: файлы сохраняются на диск, одинаковые
+    (по SHA-256) анализируются один раз, результат - по каждому файлу
+    """
+    logger.info("=" * 50)
+    logger.info(f"🖼️ API: ПАКЕТНЫЙ АНАЛИЗ ИЗОБРАЖЕНИЙ ({len(files)} файлов)")
+    
+    images = await _spool_images(files)
+    return await _analyze_spooled_images(images)
+
+
 @app.post("/parse_demo", response_model=ParseDemoResponse)
 async def parse_demo(request: ParseDemoRequest):
     """
@@ -253,10 +468,23 @@ async def parse_demo(request: ParseDemoRequest):
     try:
         total_start = time.time()
         
-        # Открываем страницу в Chrome и делаем скриншот
+        # Открываем страницу в Chrome и делаем скриншот (без скриншота - сначала по HTTP)
         logger.info("  🔍 Запуск парсинга...")
         parse_start = time.time()
-        title, h1, first_paragraph, screenshot_bytes, error = await parser_service.parse_url(request.url)
+        site_text, pages = None, None
+        if request.crawl:
+            # Стартовая страница и внутренние страницы сайта (цены, бронирование, домики)
+            crawl = await parser_service.crawl_site(
+                request.url, max_pages=request.max_pages, screenshot=request.screenshot
+            )
+            page = crawl.landing
+            pages = crawl.urls
+            if len(pages) > 1:
+                site_text = crawl.text
+                logger.info(f"  🕸️ Страниц в анализе: {len(pages)}")
+        else:
+            page = await parser_service.parse_page(request.url, screenshot=request.screenshot)
+        title, h1, first_paragraph, screenshot_bytes, error = page.as_tuple()
         parse_elapsed = time.time() - parse_start
         logger.info(f"  ✓ Парсинг завершён за {parse_elapsed:.2f} сек")
         
@@ -272,28 +500,36 @@ async def parse_demo(request: ParseDemoRequest):
         logger.info(f"  📌 H1: {h1[:50] if h1 else 'N/A'}...")
         logger.info(f"  📌 Screenshot: {len(screenshot_bytes) / 1024:.1f} KB" if screenshot_bytes else "  📌 Screenshot: N/A")
         
-        # Конвертируем скриншот в base64
-        screenshot_base64 = parser_service.screenshot_to_base64(screenshot_bytes) if screenshot_bytes else None
+        # Уменьшаем, пережимаем и конвертируем скриншот в base64
+        # (в режиме только текста vision модель не вызывается)
+        screenshot_base64, screenshot_mime = None, None
+        if screenshot_bytes and request.screenshot:
+            screenshot_base64, screenshot_mime = await image_service.encode(screenshot_bytes, "image/png")
         
         # Анализируем сайт через Vision API (скриншот + контекст)
         logger.info("  🤖 Запуск AI анализа...")
         ai_start = time.time()
         
-        if screenshot_base64:
-            analysis = await openai_service.analyze_website_screenshot(
-                screenshot_base64=screenshot_base64,
-                url=request.url,
-                title=title,
-                h1=h1,
-                first_paragraph=first_paragraph
-            )
-        else:
-            logger.warning("  ⚠ Скриншот недоступен, fallback на текстовый анализ")
-            analysis = await openai_service.analyze_parsed_content(
-                title=title,
-                h1=h1,
-                paragraph=first_paragraph
-            )
+        with tracer.span("parse_demo.analyze", **{"url": request.url}):
+            if screenshot_base64:
+                analysis = await openai_service.analyze_website_screenshot(
+                    screenshot_base64=screenshot_base64,
+                    url=request.url,
+                    title=title,
+                    h1=h1,
+                    first_paragraph=first_paragraph,
+                    mime_type=screenshot_mime,
+                    site_text=site_text
+                )
+            else:
+                if request.screenshot:
+                    logger.warning("  ⚠ Скриншот недоступен, fallback на текстовый анализ")
+                analysis = await openai_service.analyze_parsed_content(
+                    title=title,
+                    h1=h1,
+                    paragraph=first_paragraph,
+                    site_text=site_text
+                )
         
         ai_elapsed = time.time() - ai_start
         logger.info(f"  ✓ AI анализ завершён за {ai_elapsed:.2f} сек")
@@ -303,7 +539,13 @@ async def parse_demo(request: ParseDemoRequest):
             title=title,
             h1=h1,
             first_paragraph=first_paragraph,
-            analysis=analysis
+            analysis=analysis,
+            meta_description=page.meta_description,
+            og=page.og,
+            prices=page.prices,
+            pages=pages,
+            timings=page.timings,
+            method=page.method
         )
         
         # Сохраняем в историю
@@ -311,7 +553,12 @@ async def parse_demo(request: ParseDemoRequest):
         history_service.add_entry(
             request_type="parse",
             request_summary=f"URL: {request.url}",
-            response_summary=analysis.summary[:100] if analysis.summary else f"Title: {title or 'N/A'}"
+            response_summary=analysis.summary[:100] if analysis.summary else f"Title: {title or 'N/A'}",
+            url=parser_service.normalize_url(request.url),
+            analysis=analysis,
+            title=title,
+            h1=h1,
+            first_paragraph=first_paragraph
         )
         
         total_elapsed = time.time() - total_start
@@ -334,63 +581,23 @@ async def parse_demo(request: ParseDemoRequest):
 
 
 @app.post("/collect_competitors", response_model=CompetitorCollectionResponse)
-async def collect_competitors():
+async def collect_competitors(
+    force: bool = Query(False, description="Анализировать заново даже неизменившиеся сайты")
+):
     """
-    Автоматический сбор данных со всех сайтов конкурентов
+    Автоматический сбор данных со всех сайтов конкурентов.
+    Сайты, не изменившиеся с прошлого запуска, не отправляются в модель повторно
     """
     logger.info("=" * 50)
     logger.info("🌐 API: АВТОМАТИЧЕСКИЙ СБОР ДАННЫХ КОНКУРЕНТОВ")
     logger.info("=" * 50)
     
     try:
-        # Собираем данные со всех конкурентов
-        competitor_results = await parser_service.parse_competitors()
+        # Парсинг и AI анализ сайтов идут конвейером с ограничением параллелизма
+        competitor_results = await collector_service.collect(force=force)
         
-        competitors_data = []
-        errors = []
-        
-        for url, title, h1, first_paragraph, screenshot_bytes, error in competitor_results:
-            if error:
-                errors.append(f"{url}: {error}")
-                continue
-            
-            # Конвертируем скриншот в base64 для анализа
-            screenshot_base64 = None
-            if screenshot_bytes:
-                screenshot_base64 = parser_service.screenshot_to_base64(screenshot_bytes)
-            
-            # Создаем объект ParsedContent
-            parsed_content = ParsedContent(
-                url=url,
-                title=title,
-                h1=h1,
-                first_paragraph=first_paragraph
-            )
-            
-            # Анализируем через AI если есть данные
-            if screenshot_base64:
-                try:
-                    logger.info(f"  🤖 Анализ {url}...")
-                    analysis = await openai_service.analyze_website_screenshot(
-                        screenshot_base64=screenshot_base64,
-                        url=url,
-                        title=title,
-                        h1=h1,
-                        first_paragraph=first_paragraph
-                    )
-                    parsed_content.analysis = analysis
-                    
-                    # Сохраняем в историю
-                    history_service.add_entry(
-                        request_type="parse",
-                        request_summary=f"URL: {url}",
-                        response_summary=analysis.summary[:200] if analysis.summary else "Анализ выполнен"
-                    )
-                    
-                except Exception as e:
-                    logger.warning(f"  Ошибка AI анализа {url}: {e}")
-            
-            competitors_data.append(parsed_content)
+        competitors_data = [item for item in competitor_results if not item.error]
+        errors = [f"{item.url}: {item.error}" for item in competitor_results if item.error]
         
         logger.info("=" * 50)
         logger.info(f"✅ СБОР ЗАВЕРШЁН: {len(competitors_data)} успешно, {len(errors)} ошибок")
@@ -412,20 +619,376 @@ async def collect_competitors():
         )
 
 
+@app.post("/collect_competitors/stream")
+async def collect_competitors_stream(
+    force: bool = Query(False, description="Анализировать заново даже неизменившиеся сайты")
+):
+    """
+    Потоковый сбор данных конкурентов (NDJSON): каждый сайт отдаётся
+    отдельной строкой сразу после анализа, последней строкой идёт итог
+    """
+    logger.info("=" * 50)
+    logger.info("🌐 API: ПОТОКОВЫЙ СБОР ДАННЫХ КОНКУРЕНТОВ")
+    logger.info("=" * 50)
+    
+    async def event_stream():
+        start_time = time.time()
+        total = 0
+        succeeded = 0
+        errors = []
+        
+        try:
+            async for item in collector_service.iter_collect(force=force):
+                total += 1
+                if item.error:
+                    errors.append(f"{item.url}: {item.error}")
+                else:
+                    succeeded += 1
+                
+                logger.info(f"  📤 [{total}] {item.url} отправлен клиенту")
+                event = CollectionStreamEvent(event="result", data=item)
+                yield event.model_dump_json() + "\n"
+            
+            elapsed = time.time() - start_time
+            logger.info(f"✅ ПОТОКОВЫЙ СБОР ЗАВЕРШЁН за {elapsed:.2f} сек: {succeeded} успешно, {len(errors)} ошибок")
+            summary = CollectionStreamEvent(
+                event="summary",
+                total_processed=total,
+                succeeded=succeeded,
+                errors=errors,
+                elapsed=round(elapsed, 3)
+            )
+            yield summary.model_dump_json() + "\n"
+            
+        except Exception as e:
+            logger.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА: {e}")
+            yield CollectionStreamEvent(event="error", error=str(e)).model_dump_json() + "\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# === Фоновые задачи ===
+
+def _submit_job(job_type: str, factory: Callable[[], Awaitable[Any]],
+                on_reject: Optional[Callable[[], None]] = None) -> JobInfo:
+    """Поставить задачу в очередь; очередь заполнена - 429 (on_reject освобождает ресурсы)"""
+    try:
+        return job_service.submit(job_type, factory).to_info()
+    except JobQueueFullError as e:
+        if on_reject is not None:
+            on_reject()
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+def _check_job_queue():
+    """Отклонить задачу до чтения загруженных файлов, если очередь заполнена"""
+    if job_service.full:
+        raise HTTPException(status_code=429, detail=str(JobQueueFullError(job_service.max_pending)))
+
+
+@app.post("/jobs/parse_demo", response_model=JobInfo, status_code=202)
+async def submit_parse_demo_job(request: ParseDemoRequest):
+    """
+    Поставить парсинг и анализ сайта в очередь
+    """
+    logger.info(f"📥 API: Задача парсинга {request.url}")
+    return _submit_job("parse", lambda: parse_demo(request))
+
+
+@app.post("/jobs/collect_competitors", response_model=JobInfo, status_code=202)
+async def submit_collect_competitors_job(
+    force: bool = Query(False, description="Анализировать заново даже неизменившиеся сайты")
+):
+    """
+    Поставить сбор данных конкурентов в очередь
+    """
+    logger.info("📥 API: Задача сбора данных конкурентов")
+    return _submit_job("collect", lambda: collect_competitors(force=force))
+
+
+@app.post("/jobs/analyze_text_batch", response_model=JobInfo, status_code=202)
+async def submit_analyze_text_batch_job(request: BatchTextAnalysisRequest):
+    """
+    Поставить пакетный анализ текстов в очередь
+    """
+    logger.info(f"📥 API: Задача пакетного анализа ({len(request.texts)} текстов)")
+    if len(request.texts) > batch_service.max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много элементов: {len(request.texts)}, максимум {batch_service.max_items}"
+        )
+    return _submit_job("text_batch", lambda: analyze_text_batch(request))
+
+
+@app.post("/jobs/analyze_image", response_model=JobInfo, status_code=202)
+async def submit_analyze_image_job(file: UploadFile = File(...)):
+    """
+    Поставить анализ изображения в очередь
+    """
+    logger.info(f"📥 API: Задача анализа изображения {file.filename}")
+    _check_job_queue()
+    
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(ALLOWED_IMAGE_TYPES)}"
+        )
+    
+    # Файл читаем сейчас: после ответа UploadFile будет закрыт
+    content = await file.read()
+    filename, content_type = file.filename, file.content_type
+    return _submit_job("image", lambda: _analyze_image_content(content, filename, content_type))
+
+
+@app.post("/jobs/analyze_image_batch", response_model=JobInfo, status_code=202)
+async def submit_analyze_image_batch_job(files: List[UploadFile] = File(...)):
+    """
+    Поставить пакетный анализ изображений в очередь
+    """
+    logger.info(f"📥 API: Задача пакетного анализа изображений ({len(files)} файлов)")
+    _check_job_queue()
+    
+    # Файлы сохраняем сейчас: после ответа UploadFile будут закрыты
+    images = await _spool_images(files)
+    return _submit_job("image_batch", lambda: _analyze_spooled_images(images),
+                       on_reject=lambda: batch_service.cleanup(images))
+
+
+@app.get("/jobs", response_model=JobListResponse)
+async def list_jobs():
+    """
+    Список фоновых задач (от новых к старым)
+    """
+    items = [job.to_info() for job in job_service.list_jobs()]
+    return JobListResponse(items=items, total=len(items), queued=job_service.queue_size)
+
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Статус и результат задачи.
+    wait > 0 - long polling: ждать смены статуса до wait секунд
+    """
+    job = job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    
+    if wait > 0 and not job.finished:
+        await job.wait_changed(timeout=min(wait, 60))
+    return job.to_info()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Подписка на статус задачи (NDJSON): строка на каждую смену статуса
+    до завершения задачи
+    """
+    job = job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    
+    async def event_stream():
+        yield job.to_info().model_dump_json() + "\n"
+        while not job.finished:
+            if await job.wait_changed(timeout=15):
+                yield job.to_info().model_dump_json() + "\n"
+            else:
+                # Пустая строка как keep-alive для прокси
+                yield "\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    """
+    Отменить задачу в очереди или в работе
+    """
+    logger.info(f"🛑 API: Отмена задачи {job_id}")
+    job = job_service.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_info()
+
+
+# === Реестр конкурентов ===
+
+@app.get("/competitors", response_model=CompetitorListResponse)
+async def list_competitors(
+    enabled: Optional[bool] = Query(None, description="Только включённые (true) или выключенные (false)")
+):
+    """
+    Сайты конкурентов в порядке сбора (по убыванию приоритета)
+    """
+    items = competitor_service.list_competitors(enabled)
+    return CompetitorListResponse(items=items, total=len(items))
+
+
+@app.post("/competitors", response_model=Competitor, status_code=201)
+async def create_competitor(request: CompetitorCreate):
+    """
+    Добавить сайт конкурента; применяется со следующего сбора
+    """
+    logger.info(f"➕ API: Добавление конкурента {request.url}")
+    try:
+        return competitor_service.create(request.model_dump())
+    except CompetitorExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/competitors/{competitor_id}", response_model=Competitor)
+async def get_competitor(competitor_id: int):
+    """
+    Сайт конкурента с настройками сбора
+    """
+    competitor = competitor_service.get(competitor_id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Конкурент не найден")
+    return competitor
+
+
+@app.patch("/competitors/{competitor_id}", response_model=Competitor)
+async def update_competitor(competitor_id: int, request: CompetitorUpdate):
+    """
+    Изменить настройки сайта (только переданные поля)
+    """
+    logger.info(f"✏️ API: Изменение конкурента {competitor_id}")
+    try:
+        competitor = competitor_service.update(competitor_id, request.model_dump(exclude_unset=True))
+    except CompetitorExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Конкурент не найден")
+    return competitor
+
+
+@app.delete("/competitors/{competitor_id}")
+async def delete_competitor(competitor_id: int):
+    """
+    Удалить сайт из реестра конкурентов
+    """
+    logger.info(f"➖ API: Удаление конкурента {competitor_id}")
+    if not competitor_service.delete(competitor_id):
+        raise HTTPException(status_code=404, detail="Конкурент не найден")
+    return {"success": True}
+
+
+# === Планировщик ===
+
+@app.get("/scheduler", response_model=SchedulerStatusResponse)
+async def get_scheduler():
+    """
+    Группы планировщика: интервал, ближайший и последний запуск
+    """
+    return SchedulerStatusResponse(
+        enabled=scheduler_service.enabled,
+        groups=scheduler_service.group_info()
+    )
+
+
+@app.get("/scheduler/runs", response_model=SchedulerRunListResponse)
+async def list_scheduler_runs(
+    group: Optional[str] = Query(None, description="Только запуски группы"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    Записи запусков сбора (от новых к старым)
+    """
+    items = scheduler_service.list_runs(group, limit)
+    return SchedulerRunListResponse(items=items, total=len(items))
+
+
+@app.post("/scheduler/{group}/run", response_model=SchedulerRun, status_code=202)
+async def run_scheduler_group(group: str):
+    """
+    Запустить сбор группы немедленно, не дожидаясь расписания
+    """
+    if group not in scheduler_service.groups:
+        raise HTTPException(status_code=404, detail="Группа не найдена")
+    run = scheduler_service.trigger(group)
+    if run is None:
+        raise HTTPException(status_code=409, detail="Предыдущий запуск группы ещё идёт")
+    return run
+
+
+# === История ===
+
 @app.get("/history", response_model=HistoryResponse)
-async def get_history():
+async def get_history(
+    limit: int = Query(settings.max_history_items, ge=1, le=100, description="Записей на странице"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    request_type: Optional[str] = Query(None, description="text, image или parse"),
+    url: Optional[str] = Query(None, description="Точный URL сайта"),
+    date_from: Optional[datetime] = Query(None, description="Не раньше (ISO 8601)"),
+    date_to: Optional[datetime] = Query(None, description="Не позже (ISO 8601)")
+):
     """
-    Получить историю последних 10 запросов
+    История запросов от новых к старым с курсорной пагинацией и фильтрами
     """
     logger.info("📋 API: Получение истории")
-    items = history_service.get_history()
+    try:
+        items, next_cursor = history_service.query(
+            limit=limit,
+            cursor=cursor,
+            request_type=request_type,
+            url=url,
+            date_from=date_from,
+            date_to=date_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     logger.info(f"  Записей: {len(items)}")
     return HistoryResponse(
         items=items,
-        total=len(items)
+        total=len(items),
+        next_cursor=next_cursor
+    )
+
+
+@app.get("/history/search", response_model=HistorySearchResponse)
+async def search_history(
+    q: str = Query(..., min_length=2, description="Поисковый запрос"),
+    limit: int = Query(20, ge=1, le=100),
+    request_type: Optional[str] = Query(None, description="text, image или parse"),
+    match: str = Query("all", pattern="^(all|any)$", description="all - все слова, any - любое слово")
+):
+    """
+    Полнотекстовый поиск по сохранённым анализам конкурентов
+    """
+    logger.info(f"🔎 API: Поиск по истории: {q}")
+    start_time = time.time()
+    items = history_service.search(q, limit=limit, request_type=request_type, match_all=match == "all")
+    elapsed_ms = (time.time() - start_time) * 1000
+    logger.info(f"  Найдено: {len(items)} за {elapsed_ms:.1f} мс")
+    return HistorySearchResponse(
+        query=q,
+        items=items,
+        total=len(items),
+        elapsed_ms=round(elapsed_ms, 2)
     )
 
 
+@app.get("/history/{entry_id}", response_model=HistoryDetail)
+async def get_history_entry(entry_id: str):
+    """
+    Полная запись истории с сохранённым анализом
+    """
+    logger.info(f"📋 API: Запись истории {entry_id}")
+    entry = history_service.get_entry(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Запись не найдена")
+    return entry
+
+
 @app.delete("/history")
 async def clear_history():
     """
@@ -437,6 +1000,81 @@ async def clear_history():
     return {"success": True, "message": "История очищена"}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Статистика кэша результатов анализа
+    """
+    return analysis_cache.stats()
+
+
+@app.get("/model/stats")
+async def model_stats():
+    """
+    Метрики вызовов модели: повторы, сбои и состояние выключателя по моделям
+    """
+    return openai_service.stats()
+
+
+# === Метрики ===
+
+def _service_samples():
+    """Текущее состояние сервисов для /metrics"""
+    cache = analysis_cache.stats()
+    yield "analysis_cache_requests_total", {"result": "hit"}, cache["hits"]
+    yield "analysis_cache_requests_total", {"result": "miss"}, cache["misses"]
+
+
+def _queue_samples():
+    """Глубина очередей и занятость пулов"""
+    yield "queue_depth", {"queue": "jobs"}, job_service.queue_size
+    limiter = openai_service.stats()["limiter"]
+    yield "queue_depth", {"queue": "model_calls"}, limiter["waiting"]
+    yield "queue_depth", {"queue": "model_calls_active"}, limiter["active"]
+    pool = parser_service.pool_stats()
+    yield "queue_depth", {"queue": "drivers_busy"}, pool["created"] - pool["idle"]
+    yield "queue_depth", {"queue": "drivers_idle"}, pool["idle"]
+    crawl = parser_service.crawl_scheduler.stats()
+    yield "queue_depth", {"queue": "host_waiting"}, crawl["waiting"]
+    yield "queue_depth", {"queue": "host_active"}, crawl["active"]
+
+
+def _model_samples():
+    """Повторы, сбои и срабатывания выключателя по моделям"""
+    for model, stats in openai_service.stats()["models"].items():
+        for event in ("retries", "failures", "opens", "rejected"):
+            yield "model_call_events_total", {"model": model, "event": event}, stats[event]
+
+
+metrics.register_collector(
+    "analysis_cache_requests_total", "counter", "Обращения к кэшу анализа", _service_samples
+)
+metrics.register_collector(
+    "queue_depth", "gauge", "Глубина очередей и занятость пулов", _queue_samples
+)
+metrics.register_collector(
+    "model_call_events_total", "counter", "Повторы, сбои и срабатывания выключателя модели", _model_samples
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Метрики в текстовом формате Prometheus
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.delete("/cache")
+async def clear_cache():
+    """
+    Очистить кэш результатов анализа
+    """
+    logger.info("🗑️ API: Очистка кэша анализа")
+    await analysis_cache.clear()
+    return {"success": True, "message": "Кэш очищен"}
+
+
 @app.get("/health")
 async def health_check():
     """Проверка работоспособности сервиса"""
@@ -2,7 +2,7 @@
 Pydantic схемы для API
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple, Union
 from pydantic import BaseModel, Field
 
 
@@ -13,9 +13,17 @@ class TextAnalysisRequest(BaseModel):
     text: str = Field(..., min_length=10, description="Текст для анализа")
 
 
+class BatchTextAnalysisRequest(BaseModel):
+    """Запрос на пакетный анализ текстов"""
+    texts: List[str] = Field(..., min_length=1, description="Тексты для анализа")
+
+
 class ParseDemoRequest(BaseModel):
     """Запрос на парсинг URL"""
     url: str = Field(..., description="URL для парсинга")
+    screenshot: bool = Field(True, description="False - только текст: быстрая загрузка по HTTP без браузера и текстовый анализ")
+    crawl: bool = Field(False, description="Обойти внутренние страницы сайта (цены, бронирование, домики, SPA) и анализировать их вместе")
+    max_pages: Optional[int] = Field(None, ge=1, description="Страниц при обходе, включая стартовую (по умолчанию из настроек)")
 
 
 # === Ответы ===
@@ -47,7 +55,14 @@ class ParsedContent(BaseModel):
     title: Optional[str] = None
     h1: Optional[str] = None
     first_paragraph: Optional[str] = None
+    meta_description: Optional[str] = None
+    og: Optional[Dict[str, str]] = Field(None, description="Open Graph теги (без префикса og:)")
+    prices: Optional[List[str]] = Field(None, description="Цены, найденные в тексте страницы")
+    pages: Optional[List[str]] = Field(None, description="Страницы сайта, вошедшие в анализ при обходе")
     analysis: Optional[CompetitorAnalysis] = None
+    timings: Optional[Dict[str, float]] = Field(None, description="Длительность этапов парсинга (сек), включая ready_wait")
+    method: Optional[str] = Field(None, description="Способ загрузки: browser или http")
+    unchanged: bool = Field(False, description="Страница не изменилась, анализ взят из прошлого запуска")
     error: Optional[str] = None
 
 
@@ -81,6 +96,172 @@ class CompetitorCollectionResponse(BaseModel):
     error: Optional[str] = None
 
 
+class CollectionStreamEvent(BaseModel):
+    """Событие потокового сбора данных конкурентов (одна строка NDJSON)"""
+    event: str  # "result" | "summary" | "error"
+    data: Optional[ParsedContent] = None
+    total_processed: Optional[int] = None
+    succeeded: Optional[int] = None
+    errors: Optional[List[str]] = None
+    elapsed: Optional[float] = None
+    error: Optional[str] = None
+
+
+# === Пакетная обработка ===
+
+class BatchItemResult(BaseModel):
+    """Результат одного элемента пакета"""
+    index: int = Field(..., description="Позиция во входном списке")
+    success: bool
+    analysis: Optional[CompetitorAnalysis] = None
+    duplicate_of: Optional[int] = Field(None, description="Индекс первого такого же элемента, чей анализ переиспользован")
+    error: Optional[str] = None
+
+
+class BatchImageItemResult(BaseModel):
+    """Результат анализа одного файла пакета"""
+    index: int = Field(..., description="Позиция файла в запросе")
+    filename: Optional[str] = None
+    success: bool
+    analysis: Optional[ImageAnalysis] = None
+    duplicate_of: Optional[int] = Field(None, description="Индекс первого такого же файла, чей анализ переиспользован")
+    error: Optional[str] = None
+
+
+class BatchTextAnalysisResponse(BaseModel):
+    """Ответ на пакетный анализ текстов (результаты в порядке входа)"""
+    success: bool
+    results: List[BatchItemResult] = Field(default_factory=list)
+    total: int = 0
+    unique: int = Field(0, description="Уникальных текстов (отправлено на анализ)")
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+class BatchImageAnalysisResponse(BaseModel):
+    """Ответ на пакетный анализ изображений (результаты в порядке файлов)"""
+    success: bool
+    results: List[BatchImageItemResult] = Field(default_factory=list)
+    total: int = 0
+    unique: int = Field(0, description="Уникальных изображений (отправлено на анализ)")
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+# === Фоновые задачи ===
+
+class JobInfo(BaseModel):
+    """Состояние фоновой задачи"""
+    id: str
+    job_type: str  # "parse", "collect", "image", "text_batch", "image_batch"
+    status: str  # "queued", "running", "succeeded", "failed", "cancelled"
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Any] = Field(None, description="Ответ соответствующего синхронного эндпоинта")
+    error: Optional[str] = None
+
+
+class JobListResponse(BaseModel):
+    """Список фоновых задач"""
+    items: List[JobInfo]
+    total: int
+    queued: int = Field(0, description="Задач, ожидающих воркера")
+
+
+# === Реестр конкурентов ===
+
+class CompetitorCreate(BaseModel):
+    """Новый сайт конкурента"""
+    url: str = Field(..., min_length=1, description="URL сайта (протокол можно не указывать)")
+    name: Optional[str] = None
+    enabled: bool = True
+    priority: int = Field(0, description="Больше - раньше в очереди сбора")
+    crawl_interval: Optional[int] = Field(None, ge=0, description="Собирать по расписанию не чаще раза в N сек")
+    timeout: Optional[float] = Field(None, gt=0, le=300, description="Таймаут загрузки страницы (сек)")
+    viewport_width: Optional[int] = Field(None, ge=320, le=7680, description="Ширина окна для скриншота")
+    viewport_height: Optional[int] = Field(None, ge=240, le=4320, description="Высота окна для скриншота")
+
+
+class CompetitorUpdate(BaseModel):
+    """Изменение сайта: только переданные поля, null сбрасывает настройку"""
+    url: Optional[str] = Field(None, min_length=1)
+    name: Optional[str] = None
+    enabled: Optional[bool] = None
+    priority: Optional[int] = None
+    crawl_interval: Optional[int] = Field(None, ge=0)
+    timeout: Optional[float] = Field(None, gt=0, le=300)
+    viewport_width: Optional[int] = Field(None, ge=320, le=7680)
+    viewport_height: Optional[int] = Field(None, ge=240, le=4320)
+
+
+class Competitor(CompetitorCreate):
+    """Сайт конкурента в реестре"""
+    id: int
+    last_crawled_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+    @property
+    def viewport(self) -> Optional[Tuple[int, int]]:
+        """Размер окна для скриншота, если задан"""
+        if self.viewport_width and self.viewport_height:
+            return self.viewport_width, self.viewport_height
+        return None
+
+
+class CompetitorListResponse(BaseModel):
+    """Список сайтов конкурентов"""
+    items: List[Competitor]
+    total: int
+
+
+# === Планировщик ===
+
+class SchedulerRun(BaseModel):
+    """Запись запуска сбора по расписанию"""
+    id: int
+    group: str
+    trigger: str  # "schedule", "manual"
+    status: str  # "running", "succeeded", "failed", "skipped", "cancelled", "interrupted"
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration: Optional[float] = Field(None, description="Длительность запуска (сек)")
+    sites: int = 0
+    succeeded: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    error: Optional[str] = None
+    site_timings: Dict[str, float] = Field(default_factory=dict, description="Время парсинга каждого сайта (сек)")
+
+
+class ScheduleGroupInfo(BaseModel):
+    """Группа URL планировщика"""
+    name: str
+    urls: List[str] = Field(default_factory=list, description="Пусто - все конкуренты")
+    interval: float
+    jitter: float
+    running: bool
+    next_run_at: Optional[datetime] = None
+    last_run: Optional[SchedulerRun] = None
+
+
+class SchedulerStatusResponse(BaseModel):
+    """Состояние планировщика"""
+    enabled: bool
+    groups: List[ScheduleGroupInfo]
+
+
+class SchedulerRunListResponse(BaseModel):
+    """Список запусков планировщика"""
+    items: List[SchedulerRun]
+    total: int
+
+
 # === История ===
 
 class HistoryItem(BaseModel):
@@ -90,10 +271,33 @@ class HistoryItem(BaseModel):
     request_type: str  # "text", "image", "parse"
     request_summary: str
     response_summary: str
+    url: Optional[str] = None
+
+
+class HistoryDetail(HistoryItem):
+    """Полная запись истории с сохранённым анализом"""
+    title: Optional[str] = None
+    h1: Optional[str] = None
+    first_paragraph: Optional[str] = None
+    analysis: Optional[Union[CompetitorAnalysis, ImageAnalysis]] = None
+
+
+class HistorySearchHit(HistoryItem):
+    """Результат полнотекстового поиска"""
+    score: float = Field(..., description="Релевантность (больше - лучше)")
+
+
+class HistorySearchResponse(BaseModel):
+    """Ответ полнотекстового поиска"""
+    query: str
+    items: List[HistorySearchHit]
+    total: int
+    elapsed_ms: float
 
 
 class HistoryResponse(BaseModel):
     """Ответ со списком истории"""
     items: List[HistoryItem]
     total: int
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы (None - страниц больше нет)")
 
@@ -1,4 +1,5 @@
 from .openai_service import OpenAIService
 from .parser_service import ParserService
 from .history_service import HistoryService
-
+from .collector_service import CollectorService
+from .job_service import JobService
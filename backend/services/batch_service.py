@@ -0,0 +1,249 @@
+"""
+Пакетный анализ: дедупликация, ограниченный параллелизм, ошибки по элементам
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from backend.config import settings
+from backend.models.schemas import BatchImageItemResult, BatchItemResult
+from backend.services.openai_service import openai_service
+from backend.services.history_service import history_service
+from backend.services.image_service import image_service
+from backend.services.rate_limiter import PRIORITY_BACKGROUND, request_priority
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.batch")
+
+# Минимальная длина текста (как в TextAnalysisRequest)
+MIN_TEXT_LENGTH = 10
+
+# Размер блока при копировании загрузки на диск
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledImage:
+    """Загруженный файл, сохранённый во временный файл"""
+    index: int
+    filename: Optional[str]
+    content_type: Optional[str]
+    path: Optional[str] = None
+    sha256: Optional[str] = None
+    size: int = 0
+    error: Optional[str] = None
+
+
+class BatchService:
+    """
+    Пакетная обработка элементов.
+
+    Одинаковые элементы анализируются один раз, остальные получают тот же
+    результат с duplicate_of. Ошибка элемента не прерывает пакет.
+    Результаты возвращаются в порядке входа.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Batch сервиса")
+
+        self.max_items = settings.batch_max_items
+        self.max_concurrency = max(1, settings.batch_max_concurrency)
+        self.max_image_bytes = settings.batch_max_image_bytes
+        self.spool_dir = settings.batch_spool_dir or None
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+        logger.info(f"  Элементов в пакете: до {self.max_items}")
+        logger.info(f"  Элементов одновременно: {self.max_concurrency}")
+        logger.info("Batch сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    async def _analyze_text(self, index: int, text: str, semaphore: asyncio.Semaphore) -> BatchItemResult:
+        """Анализ одного уникального текста"""
+        if len(text) < MIN_TEXT_LENGTH:
+            return BatchItemResult(
+                index=index,
+                success=False,
+                error=f"Текст короче {MIN_TEXT_LENGTH} символов"
+            )
+
+        # Пакеты уступают интерактивным вызовам модели
+        request_priority.set(PRIORITY_BACKGROUND)
+        async with semaphore:
+            try:
+                analysis = await openai_service.analyze_text(text)
+            except Exception as e:
+                logger.warning(f"  ✗ Элемент {index}: {e}")
+                return BatchItemResult(index=index, success=False, error=str(e))
+
+        history_service.add_entry(
+            request_type="text",
+            request_summary=text[:100] + "..." if len(text) > 100 else text,
+            response_summary=analysis.summary,
+            analysis=analysis
+        )
+        return BatchItemResult(index=index, success=True, analysis=analysis)
+
+    async def analyze_texts(self, texts: List[str]) -> List[BatchItemResult]:
+        """Проанализировать тексты пакетом, результаты - в порядке входа"""
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Индекс первого вхождения каждого текста
+        first_index: Dict[str, int] = {}
+        for index, text in enumerate(texts):
+            first_index.setdefault(text.strip(), index)
+
+        logger.info("=" * 60)
+        logger.info(f"📦 ПАКЕТНЫЙ АНАЛИЗ ТЕКСТОВ: {len(texts)} элементов, уникальных: {len(first_index)}")
+        logger.info("=" * 60)
+
+        unique_results = await asyncio.gather(
+            *(self._analyze_text(index, text, semaphore) for text, index in first_index.items())
+        )
+        by_index = {result.index: result for result in unique_results}
+
+        results = []
+        for index, text in enumerate(texts):
+            original = first_index[text.strip()]
+            if original == index:
+                results.append(by_index[index])
+            else:
+                results.append(by_index[original].model_copy(update={"index": index, "duplicate_of": original}))
+
+        succeeded = sum(1 for result in results if result.success)
+        elapsed = time.time() - start_time
+        logger.info(f"✅ ПАКЕТ ЗАВЕРШЁН за {elapsed:.2f} сек: {succeeded} успешно, {len(results) - succeeded} ошибок")
+        return results
+
+    async def spool_upload(self, index: int, upload) -> SpooledImage:
+        """
+        Скопировать загрузку (UploadFile) во временный файл блоками,
+        считая SHA-256 по пути. Файл целиком в памяти не держится.
+        """
+        image = SpooledImage(index=index, filename=upload.filename, content_type=upload.content_type)
+        digest = hashlib.sha256()
+        fd, image.path = tempfile.mkstemp(prefix="upload_", dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as spool:
+                while True:
+                    chunk = await upload.read(SPOOL_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    image.size += len(chunk)
+                    if image.size > self.max_image_bytes:
+                        image.error = f"Файл больше {self.max_image_bytes // (1024 * 1024)} MB"
+                        break
+                    digest.update(chunk)
+                    await asyncio.to_thread(spool.write, chunk)
+        except Exception as e:
+            image.error = f"Не удалось сохранить файл: {e}"
+        finally:
+            await upload.close()
+
+        if image.error:
+            self.cleanup([image])
+        else:
+            image.sha256 = digest.hexdigest()
+        return image
+
+    @staticmethod
+    def cleanup(images: List[SpooledImage]):
+        """Удалить временные файлы"""
+        for image in images:
+            if image.path:
+                try:
+                    os.unlink(image.path)
+                except FileNotFoundError:
+                    pass
+                image.path = None
+
+    async def _analyze_image(self, image: SpooledImage, semaphore: asyncio.Semaphore) -> BatchImageItemResult:
+        """Анализ одного уникального изображения (файл читается только под семафором)"""
+        request_priority.set(PRIORITY_BACKGROUND)
+        async with semaphore:
+            try:
+                with open(image.path, "rb") as spool:
+                    content = await asyncio.to_thread(spool.read)
+                image_base64, image_mime = await image_service.encode(content, image.content_type)
+                del content
+                analysis = await openai_service.analyze_image(image_base64=image_base64, mime_type=image_mime)
+            except Exception as e:
+                logger.warning(f"  ✗ Файл {image.index} ({image.filename}): {e}")
+                return BatchImageItemResult(
+                    index=image.index, filename=image.filename, success=False, error=str(e)
+                )
+            finally:
+                self.cleanup([image])
+
+        history_service.add_entry(
+            request_type="image",
+            request_summary=f"Изображение: {image.filename}",
+            response_summary=analysis.description[:200] if analysis.description else "Анализ изображения",
+            analysis=analysis
+        )
+        return BatchImageItemResult(index=image.index, filename=image.filename, success=True, analysis=analysis)
+
+    async def analyze_images(self, images: List[SpooledImage]) -> List[BatchImageItemResult]:
+        """
+        Проанализировать сохранённые файлы пакетом, результаты - в порядке файлов.
+        Временные файлы удаляются по мере обработки.
+        """
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Первый файл с каждым хэшем; повторы сразу удаляются с диска
+        first_index: Dict[str, int] = {}
+        unique: List[SpooledImage] = []
+        for image in images:
+            if image.error:
+                continue
+            if image.sha256 in first_index:
+                self.cleanup([image])
+            else:
+                first_index[image.sha256] = image.index
+                unique.append(image)
+
+        logger.info("=" * 60)
+        logger.info(f"📦 ПАКЕТНЫЙ АНАЛИЗ ИЗОБРАЖЕНИЙ: {len(images)} файлов, уникальных: {len(unique)}")
+        logger.info("=" * 60)
+
+        try:
+            unique_results = await asyncio.gather(
+                *(self._analyze_image(image, semaphore) for image in unique)
+            )
+        finally:
+            self.cleanup(images)
+        by_index = {result.index: result for result in unique_results}
+
+        results = []
+        for image in images:
+            if image.error:
+                results.append(BatchImageItemResult(
+                    index=image.index, filename=image.filename, success=False, error=image.error
+                ))
+                continue
+            original = first_index[image.sha256]
+            if original == image.index:
+                results.append(by_index[original])
+            else:
+                results.append(by_index[original].model_copy(
+                    update={"index": image.index, "filename": image.filename, "duplicate_of": original}
+                ))
+
+        succeeded = sum(1 for result in results if result.success)
+        elapsed = time.time() - start_time
+        logger.info(f"✅ ПАКЕТ ЗАВЕРШЁН за {elapsed:.2f} сек: {succeeded} успешно, {len(results) - succeeded} ошибок")
+        return results
+
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Batch сервиса...")
+batch_service = BatchService()
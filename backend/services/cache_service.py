@@ -0,0 +1,217 @@
+"""
+Кэш результатов AI анализа с адресацией по содержимому
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from backend.config import settings
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.cache")
+
+# Версия промптов: увеличить, чтобы сбросить кэш при изменении логики разбора ответа
+PROMPT_VERSION = "1"
+
+
+class MemoryCacheBackend:
+    """LRU кэш в памяти процесса"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: float):
+        with self._lock:
+            self._items[key] = (time.time() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DiskCacheBackend:
+    """
+    LRU кэш на диске: по JSON файлу на ключ.
+    Порядок вытеснения определяется временем последнего доступа (mtime).
+    Методы блокируют поток файловым вводом-выводом - AnalysisCache
+    вызывает их через asyncio.to_thread.
+    """
+
+    def __init__(self, directory: str, max_items: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+        self._lock = threading.Lock()
+
+        # Индекс ключей в порядке последнего доступа
+        files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        self._index: "OrderedDict[str, None]" = OrderedDict((p.stem, None) for p in files)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            if key not in self._index:
+                return None
+            path = self._path(key)
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Повреждённая запись кэша {key[:12]}: {e}")
+                self._remove(key)
+                return None
+
+            if entry.get("expires_at", 0) < time.time():
+                self._remove(key)
+                return None
+
+            os.utime(path)
+            self._index.move_to_end(key)
+            return entry.get("value")
+
+    def set(self, key: str, value: dict, ttl: float):
+        with self._lock:
+            entry = {"expires_at": time.time() + ttl, "value": value}
+            path = self._path(key)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+
+            self._index[key] = None
+            self._index.move_to_end(key)
+            while len(self._index) > self.max_items:
+                oldest = next(iter(self._index))
+                self._remove(oldest)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class AnalysisCache:
+    """
+    Кэш результатов анализа.
+    Ключ - SHA-256 от (тип анализа, модель, версия и текст промпта, входные данные).
+    Обращения к дисковому хранилищу выполняются в потоке, не блокируя event loop.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация кэша анализа")
+
+        self.ttl = settings.analysis_cache_ttl
+        self.hits = 0
+        self.misses = 0
+
+        backend = settings.analysis_cache_backend
+        self._backend: Optional[Union[MemoryCacheBackend, DiskCacheBackend]]
+        if backend == "disk":
+            self._backend = DiskCacheBackend(settings.analysis_cache_dir, settings.analysis_cache_max_items)
+            logger.info(f"  Хранилище: диск ({settings.analysis_cache_dir}), записей: {len(self._backend)}")
+        elif backend == "memory":
+            self._backend = MemoryCacheBackend(settings.analysis_cache_max_items)
+            logger.info("  Хранилище: память")
+        else:
+            self._backend = None
+            logger.info("  Кэш отключён")
+
+        logger.info(f"  TTL: {self.ttl} сек, макс. записей: {settings.analysis_cache_max_items}")
+        logger.info("Кэш анализа инициализирован ✓")
+        logger.info("=" * 50)
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt: str, *parts: Union[str, bytes, None]) -> str:
+        """Ключ кэша по содержимому запроса"""
+        digest = hashlib.sha256()
+        for part in (kind, model, PROMPT_VERSION, prompt, *parts):
+            data = part if isinstance(part, bytes) else (part or "").encode("utf-8")
+            # Длина перед данными, чтобы границы частей не смешивались
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    async def _call(self, method, *args):
+        """Метод хранилища: дисковое - в потоке, память - сразу"""
+        if isinstance(self._backend, DiskCacheBackend):
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[dict]:
+        if self._backend is None:
+            return None
+        value = await self._call(self._backend.get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict):
+        if self._backend is None:
+            return
+        try:
+            await self._call(self._backend.set, key, value, self.ttl)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить результат в кэш: {e}")
+
+    async def clear(self):
+        if self._backend is not None:
+            await self._call(self._backend.clear)
+        logger.info("🗑️ Кэш анализа очищен")
+
+    def stats(self) -> Dict[str, Union[str, int, float]]:
+        total = self.hits + self.misses
+        return {
+            "backend": settings.analysis_cache_backend if self.enabled else "none",
+            "items": len(self._backend) if self._backend is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+# Глобальный экземпляр
+analysis_cache = AnalysisCache()
@@ -0,0 +1,110 @@
+"""
+Определение пути к ChromeDriver один раз на процесс
+"""
+import os
+import shutil
+import time
+import logging
+import threading
+from typing import Optional
+
+from backend.config import settings
+
+# Логгер для резолвера
+logger = logging.getLogger("competitor_monitor.chromedriver")
+
+# Через сколько секунд повторить поиск после неудачи
+RETRY_INTERVAL = 60.0
+
+
+class ChromeDriverResolver:
+    """
+    Находит бинарник chromedriver и кэширует результат.
+
+    Порядок поиска:
+    1. CHROMEDRIVER_PATH из настроек
+    2. chromedriver в PATH
+    3. webdriver-manager (сеть), только если разрешён chromedriver_auto_install
+       и только при прогреве (install=True) - обработка запросов в сеть не ходит
+
+    Найденный путь кэшируется на весь процесс. Неудача кэшируется на
+    RETRY_INTERVAL секунд: драйвер, установленный или ставший доступным
+    после запуска, подхватывается без перезапуска, а запросы не повторяют
+    поиск на каждой странице.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._path: Optional[str] = None
+        self._error: Optional[str] = None
+
+    @property
+    def path(self) -> Optional[str]:
+        """Закэшированный путь (None, если ещё не определён или не найден)"""
+        return self._path
+
+    def resolve(self, install: bool = False) -> str:
+        """
+        Вернуть путь к chromedriver, определив его при первом вызове.
+        install=True (только прогрев при запуске) разрешает загрузку через webdriver-manager
+        """
+        if self._path is None and time.monotonic() >= self._retry_at:
+            with self._lock:
+                if self._path is None and time.monotonic() >= self._retry_at:
+                    self._error = None
+                    self._resolve_once(install)
+                    if self._path is None:
+                        self._retry_at = time.monotonic() + RETRY_INTERVAL
+
+        if self._path is None:
+            raise RuntimeError(self._error or "ChromeDriver не найден")
+        return self._path
+
+    def _resolve_once(self, install: bool):
+        """Поиск chromedriver"""
+        logger.info("🔧 Определение пути к ChromeDriver...")
+        start_time = time.time()
+
+        # 1. Явно заданный путь
+        configured = settings.chromedriver_path
+        if configured:
+            if os.path.isfile(configured):
+                self._path = configured
+                logger.info(f"  ✓ Из настроек: {configured}")
+                return
+            self._error = f"CHROMEDRIVER_PATH указывает на несуществующий файл: {configured}"
+            logger.error(f"  ✗ {self._error}")
+            return
+
+        # 2. chromedriver в PATH
+        found = shutil.which("chromedriver")
+        if found:
+            self._path = found
+            logger.info(f"  ✓ Найден в PATH: {found}")
+            return
+
+        # 3. Автоматическая установка (требует сеть)
+        if not settings.chromedriver_auto_install:
+            self._error = "ChromeDriver не найден в PATH, автоустановка отключена (задайте CHROMEDRIVER_PATH)"
+            logger.error(f"  ✗ {self._error}")
+            return
+        if not install:
+            self._error = "ChromeDriver не найден в PATH, автоустановка выполняется только при запуске"
+            logger.error(f"  ✗ {self._error}")
+            return
+
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            logger.info("  📥 Загрузка ChromeDriver через webdriver-manager...")
+            self._path = ChromeDriverManager().install()
+            elapsed = time.time() - start_time
+            logger.info(f"  ✓ Установлен за {elapsed:.2f} сек: {self._path}")
+        except Exception as e:
+            self._error = f"Не удалось установить ChromeDriver: {str(e)[:200]}"
+            logger.error(f"  ✗ {self._error}")
+
+
+# Глобальный экземпляр
+chromedriver_resolver = ChromeDriverResolver()
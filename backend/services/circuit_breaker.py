@@ -0,0 +1,115 @@
+"""
+Автоматический выключатель (circuit breaker) для вызовов внешних сервисов
+"""
+import time
+import logging
+import threading
+from typing import Dict, Union
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.circuit_breaker")
+
+# Состояния выключателя
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонён: сервис недавно не отвечал, выключатель разомкнут"""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"Модель {name} временно недоступна, повтор через {retry_in:.0f} сек")
+
+
+class CircuitBreaker:
+    """
+    Выключатель одного ресурса (модели).
+
+    closed    - вызовы проходят, подряд идущие сбои считаются;
+    open      - после failure_threshold сбоев подряд вызовы сразу отклоняются
+                на reset_timeout секунд;
+    half_open - по истечении таймаута пропускается один пробный вызов:
+                успех замыкает выключатель, сбой снова размыкает.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.opens = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Проверить, можно ли выполнить вызов (иначе CircuitOpenError)"""
+        with self._lock:
+            if self.state == STATE_OPEN:
+                retry_in = self._opened_at + self.reset_timeout - time.time()
+                if retry_in > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = STATE_HALF_OPEN
+                logger.info(f"🟡 {self.name}: пробный вызов после паузы")
+
+            if self.state == STATE_HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probe_in_flight = True
+
+            self.calls += 1
+
+    def record_success(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self._failures = 0
+            if self.state != STATE_CLOSED:
+                logger.info(f"🟢 {self.name}: сервис снова доступен")
+            self.state = STATE_CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self.failures += 1
+            self._failures += 1
+            if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    self.opens += 1
+                    logger.warning(
+                        f"🔴 {self.name}: выключатель разомкнут после {self._failures} сбоев "
+                        f"на {self.reset_timeout:.0f} сек"
+                    )
+                self.state = STATE_OPEN
+                self._opened_at = time.time()
+
+    def record_cancel(self):
+        """Вызов прерван до результата: освободить пробный слот"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Union[str, int]]:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,194 @@
+"""
+Конвейерный сбор и анализ данных конкурентов
+"""
+import asyncio
+import time
+import logging
+from typing import AsyncIterator, List, Optional
+
+from backend.config import settings
+from backend.models.schemas import Competitor, ParsedContent
+from backend.services.openai_service import openai_service
+from backend.services.parser_service import parser_service
+from backend.services.history_service import history_service
+from backend.services.image_service import image_service
+from backend.services.fingerprint_service import fingerprint_service
+from backend.services.competitor_service import competitor_service
+from backend.services.crawl_scheduler import interleave_by_host
+from backend.services.rate_limiter import PRIORITY_BACKGROUND, request_priority
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.collector")
+
+
+class CollectorService:
+    """
+    Сбор данных конкурентов: парсинг и AI анализ каждого сайта идут
+    независимыми задачами, поэтому анализ одного сайта перекрывается
+    с загрузкой следующих.
+
+    Ограничения параллелизма:
+    - collector_max_concurrency - сайтов в обработке одновременно
+    - пул драйверов парсера - одновременных загрузок страниц
+    - планировщик обхода парсера - загрузок одного хоста и пауз между ними
+      (parser_per_host_concurrency, parser_host_min_delay, Crawl-delay);
+      страницы одного хоста в очереди чередуются с другими хостами
+    - openai_max_concurrency - одновременных вызовов модели
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Collector сервиса")
+
+        self.max_concurrency = max(1, settings.collector_max_concurrency)
+        self.crawl_pages = max(1, settings.collector_crawl_pages)
+
+        logger.info(f"  Сайтов одновременно: {self.max_concurrency}")
+        logger.info(f"  Страниц каждого сайта: {self.crawl_pages}")
+        logger.info("Collector сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    async def _process_site(self, site: Competitor, semaphore: asyncio.Semaphore, force: bool = False) -> ParsedContent:
+        """Парсинг и анализ одного сайта (force - анализировать даже без изменений)"""
+        # Сбор - фоновая работа: интерактивные вызовы модели идут раньше
+        request_priority.set(PRIORITY_BACKGROUND)
+        url = site.url
+        async with semaphore:
+            start_time = time.time()
+
+            site_text, pages = None, None
+            try:
+                if self.crawl_pages > 1:
+                    # Вместе со стартовой - внутренние страницы (цены, бронирование, домики)
+                    crawl = await parser_service.crawl_site(
+                        url, max_pages=self.crawl_pages, timeout=site.timeout, viewport=site.viewport
+                    )
+                    page = crawl.landing
+                    pages = crawl.urls
+                    if len(pages) > 1:
+                        site_text = crawl.text
+                else:
+                    page = await parser_service.parse_page(url, timeout=site.timeout, viewport=site.viewport)
+            except Exception as e:
+                logger.warning(f"  ✗ Ошибка парсинга {url}: {e}")
+                return ParsedContent(url=url, error=str(e))
+
+            if page.error:
+                logger.warning(f"  ✗ Ошибка парсинга {url}: {page.error}")
+                return ParsedContent(url=url, timings=page.timings, error=page.error)
+            competitor_service.mark_crawled(url)
+
+            title, h1, first_paragraph, screenshot_bytes = page.title, page.h1, page.first_paragraph, page.screenshot
+            parsed_content = ParsedContent(
+                url=url,
+                title=title,
+                h1=h1,
+                first_paragraph=first_paragraph,
+                meta_description=page.meta_description,
+                og=page.og,
+                prices=page.prices,
+                pages=pages,
+                timings=page.timings,
+                method=page.method
+            )
+
+            # Неизменившуюся страницу не отправляем в модель повторно
+            fingerprint = await asyncio.to_thread(
+                fingerprint_service.compute, page, site_text
+            )
+            previous = None if force else fingerprint_service.find_unchanged(url, fingerprint)
+            if previous is not None:
+                parsed_content.analysis = previous
+                parsed_content.unchanged = True
+                logger.info(f"  ♻️ {url} не изменился, используем прошлый анализ")
+
+            # Анализируем через AI если есть скриншот
+            elif screenshot_bytes:
+                try:
+                    logger.info(f"  🤖 Анализ {url}...")
+                    screenshot_base64, screenshot_mime = await image_service.encode(screenshot_bytes, "image/png")
+                    analysis = await openai_service.analyze_website_screenshot(
+                        screenshot_base64=screenshot_base64,
+                        url=url,
+                        title=title,
+                        h1=h1,
+                        first_paragraph=first_paragraph,
+                        mime_type=screenshot_mime,
+                        site_text=site_text
+                    )
+                    parsed_content.analysis = analysis
+                    fingerprint_service.save(url, fingerprint, analysis)
+
+                    # Сохраняем в историю
+                    history_service.add_entry(
+                        request_type="parse",
+                        request_summary=f"URL: {url}",
+                        response_summary=analysis.summary[:200] if analysis.summary else "Анализ выполнен",
+                        url=url,
+                        analysis=analysis,
+                        title=title,
+                        h1=h1,
+                        first_paragraph=first_paragraph
+                    )
+
+                except Exception as e:
+                    logger.warning(f"  Ошибка AI анализа {url}: {e}")
+
+            elapsed = time.time() - start_time
+            logger.info(f"  ✓ {url} обработан за {elapsed:.2f} сек")
+            return parsed_content
+
+    async def iter_collect(self, urls: Optional[List[str]] = None, force: bool = False,
+                           due_only: bool = False) -> AsyncIterator[ParsedContent]:
+        """Обработать сайты, отдавая результаты по мере готовности"""
+        sites = interleave_by_host(competitor_service.sites(urls, due_only), lambda site: site.url)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        logger.info("=" * 60)
+        logger.info("🚀 КОНВЕЙЕРНЫЙ СБОР ДАННЫХ КОНКУРЕНТОВ")
+        logger.info(f"   Количество сайтов: {len(sites)}")
+        logger.info("=" * 60)
+
+        tasks = [asyncio.ensure_future(self._process_site(site, semaphore, force)) for site in sites]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # Потребитель прекратил чтение - отменяем оставшиеся задачи
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def collect(self, urls: Optional[List[str]] = None, force: bool = False,
+                      due_only: bool = False) -> List[ParsedContent]:
+        """
+        Обработать сайты и вернуть результаты в порядке приоритета.
+        Без urls - все включённые сайты реестра конкурентов;
+        due_only - только сайты, которым пора по crawl_interval
+        """
+        sites = interleave_by_host(competitor_service.sites(urls, due_only), lambda site: site.url)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        start_time = time.time()
+
+        logger.info("=" * 60)
+        logger.info("🚀 КОНВЕЙЕРНЫЙ СБОР ДАННЫХ КОНКУРЕНТОВ")
+        logger.info(f"   Количество сайтов: {len(sites)}")
+        logger.info("=" * 60)
+
+        # Задачи стартуют по порядку, семафор пропускает их по очереди -
+        # сайты с большим приоритетом обрабатываются первыми (хосты чередуются)
+        results = await asyncio.gather(
+            *(self._process_site(site, semaphore, force) for site in sites)
+        )
+
+        elapsed = time.time() - start_time
+        unchanged = sum(1 for item in results if item.unchanged)
+        logger.info("=" * 60)
+        logger.info(f"✅ СБОР ЗАВЕРШЁН за {elapsed:.2f} сек: {len(results)} сайтов, без изменений: {unchanged}")
+        logger.info("=" * 60)
+        return list(results)
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Collector сервиса...")
+collector_service = CollectorService()
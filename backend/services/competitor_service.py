@@ -0,0 +1,243 @@
+"""
+Реестр сайтов конкурентов с настройками сбора для каждого сайта
+"""
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.config import settings
+from backend.models.schemas import Competitor
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.competitors")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS competitors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    priority INTEGER NOT NULL DEFAULT 0,
+    crawl_interval INTEGER,
+    timeout REAL,
+    viewport_width INTEGER,
+    viewport_height INTEGER,
+    last_crawled_at TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_competitors_order ON competitors(enabled, priority DESC, id);
+"""
+
+# Поля, которые можно менять через API
+EDITABLE_FIELDS = (
+    "url", "name", "enabled", "priority", "crawl_interval", "timeout", "viewport_width", "viewport_height"
+)
+# Поля, которые можно сбросить (null - значение по умолчанию)
+NULLABLE_FIELDS = ("name", "crawl_interval", "timeout", "viewport_width", "viewport_height")
+
+
+class CompetitorExistsError(ValueError):
+    """Сайт с таким URL уже есть в реестре"""
+
+
+def normalize_url(url: str) -> str:
+    """URL в том виде, в котором его загружает парсер"""
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        return 'https://' + url
+    return url
+
+
+class CompetitorService:
+    """
+    Реестр конкурентов в базе истории (таблица competitors).
+
+    Для каждого сайта хранятся приоритет (больше - раньше в очереди сбора),
+    частота сбора (не чаще раза в crawl_interval секунд при сборе по
+    расписанию), свой таймаут загрузки и размер окна для скриншота.
+    Изменения применяются со следующего сбора, без перезапуска сервера.
+    При первом запуске реестр заполняется из competitor_urls.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Competitor сервиса")
+
+        self.db_path = Path(settings.history_db)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        self._seed()
+
+        logger.info(f"  Сайтов в реестре: {self.count()}")
+        logger.info("Competitor сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    def _seed(self):
+        """Однократный перенос competitor_urls из конфигурации в новый реестр"""
+        with self._lock:
+            # Счётчик AUTOINCREMENT есть, если в таблицу уже что-то добавляли:
+            # реестр, очищенный через API, повторно не заполняется
+            used = self._conn.execute(
+                "SELECT 1 FROM sqlite_sequence WHERE name = 'competitors'"
+            ).fetchone()
+        if used is not None or self.count() > 0:
+            return
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO competitors (url, created_at, updated_at) VALUES (?, ?, ?)",
+                [(normalize_url(url), now, now) for url in settings.competitor_urls]
+            )
+        logger.info(f"  Перенесено сайтов из конфигурации: {len(settings.competitor_urls)}")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM competitors").fetchone()[0]
+
+    @staticmethod
+    def _to_competitor(row: sqlite3.Row) -> Competitor:
+        return Competitor(
+            id=row["id"],
+            url=row["url"],
+            name=row["name"],
+            enabled=bool(row["enabled"]),
+            priority=row["priority"],
+            crawl_interval=row["crawl_interval"],
+            timeout=row["timeout"],
+            viewport_width=row["viewport_width"],
+            viewport_height=row["viewport_height"],
+            last_crawled_at=datetime.fromisoformat(row["last_crawled_at"]) if row["last_crawled_at"] else None,
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"])
+        )
+
+    def list_competitors(self, enabled: Optional[bool] = None) -> List[Competitor]:
+        """Сайты в порядке сбора: по убыванию приоритета, затем по времени добавления"""
+        query = "SELECT * FROM competitors"
+        params: list = []
+        if enabled is not None:
+            query += " WHERE enabled = ?"
+            params.append(int(enabled))
+        query += " ORDER BY priority DESC, id"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._to_competitor(row) for row in rows]
+
+    def get(self, competitor_id: int) -> Optional[Competitor]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM competitors WHERE id = ?", (competitor_id,)).fetchone()
+        return self._to_competitor(row) if row else None
+
+    def create(self, fields: Dict[str, Any]) -> Competitor:
+        """Добавить сайт (CompetitorExistsError, если URL уже в реестре)"""
+        values = {key: value for key, value in fields.items() if key in EDITABLE_FIELDS}
+        values["url"] = normalize_url(values["url"])
+        if "enabled" in values:
+            values["enabled"] = int(values["enabled"])
+        now = datetime.now().isoformat()
+        values["created_at"] = values["updated_at"] = now
+
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        try:
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"INSERT INTO competitors ({columns}) VALUES ({placeholders})", list(values.values())
+                )
+        except sqlite3.IntegrityError:
+            raise CompetitorExistsError(f"Сайт {values['url']} уже есть в реестре")
+
+        logger.info(f"➕ Конкурент добавлен: {values['url']}")
+        return self.get(cursor.lastrowid)
+
+    def update(self, competitor_id: int, fields: Dict[str, Any]) -> Optional[Competitor]:
+        """Изменить переданные поля (None в поле сбрасывает настройку к значению по умолчанию)"""
+        values = {
+            key: value for key, value in fields.items()
+            if key in EDITABLE_FIELDS and (value is not None or key in NULLABLE_FIELDS)
+        }
+        if "url" in values:
+            values["url"] = normalize_url(values["url"])
+        if "enabled" in values:
+            values["enabled"] = int(values["enabled"])
+        values["updated_at"] = datetime.now().isoformat()
+
+        assignments = ", ".join(f"{key} = ?" for key in values)
+        try:
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"UPDATE competitors SET {assignments} WHERE id = ?", [*values.values(), competitor_id]
+                )
+        except sqlite3.IntegrityError:
+            raise CompetitorExistsError(f"Сайт {values['url']} уже есть в реестре")
+        if cursor.rowcount == 0:
+            return None
+        return self.get(competitor_id)
+
+    def delete(self, competitor_id: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM competitors WHERE id = ?", (competitor_id,))
+        if cursor.rowcount:
+            logger.info(f"➖ Конкурент {competitor_id} удалён из реестра")
+        return cursor.rowcount > 0
+
+    def sites(self, urls: Optional[List[str]] = None, due_only: bool = False) -> List[Competitor]:
+        """
+        Сайты для сбора в порядке приоритета.
+        Без urls - все включённые сайты реестра; URL не из реестра
+        собираются с настройками по умолчанию, выключенные в реестре
+        пропускаются и при явном указании. due_only - только сайты,
+        у которых с прошлого сбора прошло не меньше crawl_interval.
+        """
+        if urls is None:
+            sites = self.list_competitors(enabled=True)
+        else:
+            normalized = list(dict.fromkeys(normalize_url(url) for url in urls))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM competitors WHERE url IN ({', '.join('?' for _ in normalized)})", normalized
+                ).fetchall() if normalized else []
+            known = {row["url"]: self._to_competitor(row) for row in rows}
+            disabled = [url for url, site in known.items() if not site.enabled]
+            if disabled:
+                logger.info(f"  Пропущены выключенные сайты: {', '.join(disabled)}")
+            now = datetime.now()
+            sites = [
+                known.get(url) or Competitor(id=0, url=url, created_at=now, updated_at=now)
+                for url in normalized if url not in disabled
+            ]
+            sites.sort(key=lambda site: -site.priority)
+
+        if due_only:
+            now = datetime.now()
+            sites = [
+                site for site in sites
+                if not site.crawl_interval or site.last_crawled_at is None
+                or (now - site.last_crawled_at).total_seconds() >= site.crawl_interval
+            ]
+        return sites
+
+    def mark_crawled(self, url: str):
+        """Запомнить время сбора сайта (для crawl_interval)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE competitors SET last_crawled_at = ? WHERE url = ?", (datetime.now().isoformat(), url)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Competitor сервиса...")
+competitor_service = CompetitorService()
@@ -0,0 +1,239 @@
+"""
+Вежливый обход сайтов: ограничения по хосту и robots.txt
+"""
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, TypeVar
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from backend.config import settings
+from backend.services.rate_limiter import PRIORITY_BACKGROUND, request_priority
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.crawl_scheduler")
+
+T = TypeVar("T")
+
+# Сколько хранить robots.txt, который не удалось загрузить (сеть, 5xx)
+ROBOTS_RETRY_TTL = 300.0
+
+# Сколько хостов хранить: сверх лимита удаляются давно не использованные
+MAX_HOSTS = 1000
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def interleave_by_host(items: List[T], url_of: Callable[[T], str]) -> List[T]:
+    """
+    Переставить элементы так, чтобы хосты чередовались (по кругу),
+    сохраняя порядок внутри хоста. Тогда соседние задачи обращаются
+    к разным сайтам, и воркеры не простаивают в ожидании паузы одного хоста.
+    """
+    by_host: "OrderedDict[str, List[T]]" = OrderedDict()
+    for item in items:
+        by_host.setdefault(host_of(url_of(item)), []).append(item)
+
+    result: List[T] = []
+    queues = list(by_host.values())
+    depth = 0
+    while len(result) < len(items):
+        for queue in queues:
+            if depth < len(queue):
+                result.append(queue[depth])
+        depth += 1
+    return result
+
+
+class HostState:
+    """Состояние одного хоста: занятые слоты, время следующего запуска, robots.txt"""
+
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.next_start = 0.0
+        self.waiting = 0
+        self.active = 0
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_expires = 0.0
+        self.robots_lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def idle(self, now: float) -> bool:
+        """Нет загрузок и ожидающих, пауза хоста уже прошла - состояние можно удалить"""
+        return not self.active and not self.waiting and now >= self.next_start
+
+
+class CrawlScheduler:
+    """
+    Планировщик загрузок страниц по хостам.
+
+    - не больше per_host_concurrency одновременных загрузок хоста;
+    - между началами загрузок одного хоста - не меньше min_delay секунд
+      или Crawl-delay из robots.txt (если он больше, но не больше max_crawl_delay);
+    - robots.txt загружается один раз и хранится robots_ttl секунд.
+
+    Ожидание идёт отдельно для каждого хоста: пока один сайт выдерживает
+    паузу, загрузки других сайтов не задерживаются.
+
+    Crawl-delay учитывается только для фоновых загрузок (сбор конкурентов,
+    планировщик, очередь задач - PRIORITY_BACKGROUND): интерактивная загрузка
+    одной страницы соблюдает лимит загрузок хоста и min_delay и robots.txt
+    не загружает. Проверка Disallow (allowed) загружает robots.txt при любом
+    приоритете - её использует обход сайта, в том числе интерактивный.
+    Состояние хостов, не использованных robots_ttl секунд, удаляется;
+    хранится не больше MAX_HOSTS хостов.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация планировщика обхода")
+
+        self.per_host_concurrency = max(1, settings.parser_per_host_concurrency)
+        self.min_delay = max(0.0, settings.parser_host_min_delay)
+        self.respect_robots = settings.parser_respect_robots
+        self.robots_ttl = settings.parser_robots_ttl
+        self.max_crawl_delay = settings.parser_max_crawl_delay
+        self.user_agent = settings.parser_user_agent
+
+        self._hosts: "OrderedDict[str, HostState]" = OrderedDict()
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": self.user_agent},
+            timeout=httpx.Timeout(settings.parser_robots_timeout),
+            follow_redirects=True
+        ) if self.respect_robots else None
+
+        logger.info(f"  Загрузок одного хоста: {self.per_host_concurrency}")
+        logger.info(f"  Пауза между загрузками хоста: {self.min_delay} сек")
+        logger.info(f"  robots.txt: {'учитывается' if self.respect_robots else 'не учитывается'}")
+        logger.info("Планировщик обхода инициализирован ✓")
+        logger.info("=" * 50)
+
+    def _host(self, url: str) -> HostState:
+        host = host_of(url)
+        state = self._hosts.get(host)
+        if state is None:
+            self._evict()
+            state = HostState(self.per_host_concurrency)
+            self._hosts[host] = state
+        else:
+            self._hosts.move_to_end(host)
+        state.last_used = time.monotonic()
+        return state
+
+    def _evict(self):
+        """Удалить простаивающие хосты: дольше robots_ttl без загрузок или сверх MAX_HOSTS"""
+        now = time.monotonic()
+        # Хосты упорядочены по последнему использованию - сначала самые старые
+        for host, state in list(self._hosts.items()):
+            if len(self._hosts) < MAX_HOSTS and now - state.last_used < self.robots_ttl:
+                break
+            if state.idle(now):
+                del self._hosts[host]
+
+    async def _robots(self, url: str) -> Optional[RobotFileParser]:
+        """robots.txt хоста из кэша или загруженный заново (None - не учитывается)"""
+        if not self.respect_robots:
+            return None
+        state = self._host(url)
+        if state.robots is not None and time.monotonic() < state.robots_expires:
+            return state.robots
+
+        async with state.robots_lock:
+            # Пока ждали блокировку, robots.txt мог загрузить другой запрос
+            if state.robots is not None and time.monotonic() < state.robots_expires:
+                return state.robots
+
+            parsed = urlparse(url)
+            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+            robots = RobotFileParser(robots_url)
+            ttl = self.robots_ttl
+            try:
+                response = await self._client.get(robots_url)
+                if response.status_code < 400:
+                    robots.parse(response.text.splitlines())
+                else:
+                    # Нет robots.txt - ограничений нет; при ошибке сервера спросим позже
+                    robots.parse([])
+                    if response.status_code >= 500:
+                        ttl = ROBOTS_RETRY_TTL
+            except httpx.HTTPError as e:
+                logger.info(f"  robots.txt {parsed.netloc} не загружен ({type(e).__name__})")
+                robots.parse([])
+                ttl = ROBOTS_RETRY_TTL
+
+            state.robots = robots
+            state.robots_expires = time.monotonic() + ttl
+            delay = robots.crawl_delay(self.user_agent)
+            if delay:
+                logger.info(f"  🤖 {parsed.netloc}: Crawl-delay {delay} сек")
+            return robots
+
+    async def delay_for(self, url: str) -> float:
+        """
+        Пауза между загрузками хоста: min_delay или Crawl-delay из robots.txt
+        (Crawl-delay - только для фоновых загрузок)
+        """
+        if request_priority.get() != PRIORITY_BACKGROUND:
+            return self.min_delay
+        robots = await self._robots(url)
+        crawl_delay = 0.0
+        if robots is not None:
+            try:
+                crawl_delay = float(robots.crawl_delay(self.user_agent) or 0)
+            except (TypeError, ValueError):
+                crawl_delay = 0.0
+        return max(self.min_delay, min(crawl_delay, self.max_crawl_delay))
+
+    async def allowed(self, url: str) -> bool:
+        """
+        Разрешена ли загрузка URL правилами robots.txt
+        (загружает robots.txt хоста при любом приоритете, если его нет в кэше)
+        """
+        robots = await self._robots(url)
+        return robots is None or robots.can_fetch(self.user_agent, url)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """Дождаться очереди хоста и выдержать паузу перед загрузкой"""
+        state = self._host(url)
+        # Ожидающий хост не удаляется, пока загружается robots.txt
+        state.waiting += 1
+        waiting = True
+        try:
+            delay = await self.delay_for(url)
+            async with state.semaphore:
+                now = time.monotonic()
+                start = max(now, state.next_start)
+                # Время следующего запуска бронируется сразу - очередь хоста справедливая
+                state.next_start = start + delay
+                if start > now:
+                    await asyncio.sleep(start - now)
+                state.waiting -= 1
+                waiting = False
+                state.active += 1
+                try:
+                    yield
+                finally:
+                    state.active -= 1
+        finally:
+            if waiting:
+                state.waiting -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hosts": len(self._hosts),
+            "active": sum(state.active for state in self._hosts.values()),
+            "waiting": sum(state.waiting for state in self._hosts.values()),
+            "robots_cached": sum(1 for state in self._hosts.values() if state.robots is not None)
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
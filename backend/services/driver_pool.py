@@ -0,0 +1,202 @@
+"""
+Пул долгоживущих Chrome драйверов для парсера
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Callable, List, Optional, Set
+from urllib.parse import urlparse
+
+from selenium import webdriver
+
+# Логгер для пула
+logger = logging.getLogger("competitor_monitor.driver_pool")
+
+
+class PooledDriver:
+    """Драйвер из пула со счётчиком обработанных страниц"""
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+        # Origin страниц, открытых за текущую выдачу: их storage очищается при возврате
+        self.origins: Set[str] = set()
+
+    def visit(self, url: str):
+        """Запомнить origin открытой страницы"""
+        parsed = urlparse(url or "")
+        if parsed.scheme in ("http", "https") and parsed.netloc:
+            self.origins.add(f"{parsed.scheme}://{parsed.netloc}")
+
+
+class DriverPool:
+    """
+    Ограниченный пул Chrome драйверов.
+
+    Драйвер выдаётся на один парсинг, после возврата очищается
+    (вкладки, cookies, storage) и пересоздаётся после max_uses страниц
+    или если он перестал отвечать.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], webdriver.Chrome],
+        size: int,
+        max_uses: int,
+        acquire_timeout: float
+    ):
+        self._factory = factory
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: "queue.LifoQueue[PooledDriver]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    @property
+    def created(self) -> int:
+        """Количество живых драйверов (занятых и свободных)"""
+        return self._created
+
+    @property
+    def idle(self) -> int:
+        """Количество свободных драйверов"""
+        return self._idle.qsize()
+
+    def acquire(self) -> PooledDriver:
+        """Взять драйвер из пула (блокирует поток, если все заняты)"""
+        if self._closed:
+            raise RuntimeError("Пул драйверов закрыт")
+
+        deadline = time.time() + self.acquire_timeout
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                # Свободных нет - создаём новый, если есть слот
+                if self._reserve_slot():
+                    return self._spawn()
+
+                # Иначе ждём короткими интервалами: слот может освободиться
+                # и без возврата драйвера (сбойный драйвер выводится из пула)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError("Нет свободного Chrome драйвера в пуле")
+                try:
+                    pooled = self._idle.get(timeout=min(remaining, 0.5))
+                except queue.Empty:
+                    continue
+
+            if self._is_alive(pooled):
+                pooled.uses += 1
+                return pooled
+
+            logger.warning("  ⚠ Драйвер из пула не отвечает, пересоздаём")
+            self._discard(pooled)
+
+    def _reserve_slot(self) -> bool:
+        """Зарезервировать место под новый драйвер"""
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return True
+            return False
+
+    def _spawn(self) -> PooledDriver:
+        """Создать драйвер в зарезервированном слоте"""
+        try:
+            pooled = PooledDriver(self._factory())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        pooled.uses += 1
+        logger.info(f"  ➕ Новый драйвер в пуле ({self._created}/{self.size})")
+        return pooled
+
+    def release(self, pooled: PooledDriver, broken: bool = False):
+        """Вернуть драйвер в пул после парсинга"""
+        if self._closed or broken or pooled.uses >= self.max_uses:
+            reason = "закрытие пула" if self._closed else "сбой" if broken else f"лимит {self.max_uses} страниц"
+            logger.info(f"  ♻️ Драйвер выведен из пула ({reason})")
+            self._discard(pooled)
+            return
+
+        try:
+            self._reset(pooled)
+        except Exception as e:
+            logger.warning(f"  ⚠ Не удалось очистить драйвер: {e}")
+            self._discard(pooled)
+            return
+
+        self._idle.put(pooled)
+
+    def close(self):
+        """Закрыть все свободные драйверы; занятые закроются при возврате"""
+        self._closed = True
+        drivers: List[PooledDriver] = []
+        while True:
+            try:
+                drivers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for pooled in drivers:
+            self._discard(pooled)
+        logger.info(f"  Закрыто драйверов: {len(drivers)}")
+
+    def _reset(self, pooled: PooledDriver):
+        """
+        Очистить состояние драйвера между парсингами.
+        Если localStorage открытой страницы не очистился, драйвер выводится из пула
+        """
+        driver = pooled.driver
+        try:
+            pooled.visit(driver.current_url)
+        except Exception as e:
+            logger.debug(f"  Адрес текущей страницы недоступен: {e}")
+
+        # localStorage, IndexedDB, Cache Storage и service workers каждого открытого origin
+        for origin in pooled.origins:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        if driver.current_url.startswith(("http://", "https://")):
+            remaining = driver.execute_script("return window.localStorage.length")
+            if remaining:
+                raise RuntimeError(f"localStorage не очищен: {remaining} записей")
+        pooled.origins.clear()
+
+        # sessionStorage живёт во вкладке: заменяем все вкладки новой,
+        # тогда он сбрасывается для всех origin
+        handles = driver.window_handles
+        driver.switch_to.new_window("tab")
+        fresh = driver.current_window_handle
+        for handle in handles:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(fresh)
+
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+
+    @staticmethod
+    def _is_alive(pooled: PooledDriver) -> bool:
+        """Проверка, что драйвер и браузер отвечают"""
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, pooled: Optional[PooledDriver]):
+        """Закрыть драйвер и освободить слот в пуле"""
+        if pooled is None:
+            return
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"  Ошибка при закрытии драйвера: {e}")
+        with self._lock:
+            self._created -= 1
@@ -0,0 +1,193 @@
+"""
+Отпечатки содержимого сайтов для инкрементального повторного анализа
+"""
+import hashlib
+import io
+import re
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List, Optional
+
+from PIL import Image
+
+from backend.config import settings
+from backend.models.schemas import CompetitorAnalysis
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.fingerprint")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    url TEXT PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    image_hash TEXT,
+    analysis_json TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Размер перцептивного хэша: HASH_SIZE x HASH_SIZE бит. 16x16 - блоки
+# около 120x70 пикселей окна 1920x1080, заметна смена баннера или блока цен
+HASH_SIZE = 16
+
+
+@dataclass
+class Fingerprint:
+    """Отпечаток страницы: хэш нормализованного текста и перцептивный хэш скриншота"""
+    text_hash: str
+    image_hash: Optional[str]
+
+
+def normalize_text(*parts: Optional[str]) -> str:
+    """Текст без различий в регистре и пробелах"""
+    text = " ".join(part for part in parts if part)
+    return re.sub(r"\s+", " ", text.lower().replace("ё", "е")).strip()
+
+
+def text_hash(*parts: Optional[str]) -> str:
+    return hashlib.sha256(normalize_text(*parts).encode("utf-8")).hexdigest()
+
+
+def page_text_parts(page: Any, site_text: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Все извлечённые поля страницы для хэша текста: title, H1, абзацы,
+    описание, Open Graph, цены и текст внутренних страниц при обходе
+    """
+    paragraphs = page.paragraphs or ([page.first_paragraph] if page.first_paragraph else [])
+    og = " ".join(f"{key}={value}" for key, value in sorted((page.og or {}).items()))
+    return [
+        page.title, page.h1, *paragraphs, page.meta_description, og,
+        " ".join(page.prices or []), site_text
+    ]
+
+
+def image_hash(data: bytes) -> Optional[str]:
+    """
+    Перцептивный хэш (dHash): знаки разности яркости соседних пикселей
+    уменьшенного изображения. Мелкие изменения (сжатие, сглаживание шрифтов)
+    меняют лишь несколько бит.
+    """
+    try:
+        image = Image.open(io.BytesIO(data)).convert("L")
+    except Exception as e:
+        logger.warning(f"  ⚠ Не удалось посчитать хэш скриншота: {e}")
+        return None
+
+    pixels = list(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hash_distance(first: str, second: str) -> int:
+    """Расстояние Хэмминга между двумя перцептивными хэшами"""
+    if len(first) != len(second):
+        # Хэши разного размера (сохранены до смены HASH_SIZE) несравнимы
+        return HASH_SIZE * HASH_SIZE
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+class FingerprintService:
+    """
+    Хранит отпечаток и последний анализ каждого URL между запусками.
+    Страница считается неизменной, если совпадают все извлечённые поля
+    (включая абзацы, цены, описание и Open Graph), а скриншот отличается
+    не более чем на fingerprint_max_distance бит.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Fingerprint сервиса")
+
+        self.enabled = settings.incremental_analysis
+        self.max_distance = settings.fingerprint_max_distance
+        self.db_path = Path(settings.history_db)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+        logger.info(f"  Инкрементальный анализ: {'включён' if self.enabled else 'выключен'}")
+        logger.info(f"  Порог отличия скриншота: {self.max_distance} бит из {HASH_SIZE * HASH_SIZE}")
+        logger.info("Fingerprint сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    @staticmethod
+    def compute(page: Any, site_text: Optional[str] = None) -> Fingerprint:
+        """
+        Посчитать отпечаток результата парсинга (PageParseResult).
+        Скриншот обрабатывается Pillow - вызывать в потоке.
+        site_text - текст внутренних страниц при обходе сайта
+        """
+        return Fingerprint(
+            text_hash=text_hash(*page_text_parts(page, site_text)),
+            image_hash=image_hash(page.screenshot) if page.screenshot else None
+        )
+
+    def find_unchanged(self, url: str, fingerprint: Fingerprint) -> Optional[CompetitorAnalysis]:
+        """Предыдущий анализ, если страница не изменилась с прошлого запуска"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text_hash, image_hash, analysis_json FROM fingerprints WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or row["text_hash"] != fingerprint.text_hash:
+            return None
+
+        if row["image_hash"] and fingerprint.image_hash:
+            distance = hash_distance(row["image_hash"], fingerprint.image_hash)
+            if distance > self.max_distance:
+                logger.info(f"  Скриншот {url} изменился: {distance} бит")
+                return None
+        elif row["image_hash"] != fingerprint.image_hash:
+            return None
+
+        try:
+            return CompetitorAnalysis.model_validate_json(row["analysis_json"])
+        except ValueError as e:
+            logger.warning(f"  Повреждённый сохранённый анализ {url}: {e}")
+            return None
+
+    def save(self, url: str, fingerprint: Fingerprint, analysis: CompetitorAnalysis):
+        """Запомнить отпечаток и анализ страницы"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO fingerprints (url, text_hash, image_hash, analysis_json, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    text_hash = excluded.text_hash,
+                    image_hash = excluded.image_hash,
+                    analysis_json = excluded.analysis_json,
+                    updated_at = excluded.updated_at
+                """,
+                (url, fingerprint.text_hash, fingerprint.image_hash,
+                 analysis.model_dump_json(), datetime.now().isoformat())
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM fingerprints")
+        logger.info("🗑️ Отпечатки сайтов очищены")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Fingerprint сервиса...")
+fingerprint_service = FingerprintService()
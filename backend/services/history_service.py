@@ -1,128 +1,416 @@
 """
 Сервис для работы с историей запросов
 """
+import base64
 import json
 import uuid
+import sqlite3
 import logging
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
 
 from backend.config import settings
-from backend.models.schemas import HistoryItem
+from backend.models.schemas import CompetitorAnalysis, HistoryDetail, HistoryItem, HistorySearchHit, ImageAnalysis
+from backend.services.text_search import to_document, to_match_query
 
 # Логгер для сервиса
 logger = logging.getLogger("competitor_monitor.history")
 
 
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    request_type TEXT NOT NULL,
+    request_summary TEXT NOT NULL,
+    response_summary TEXT NOT NULL
+);
+"""
+
+# Колонки, добавленные после первой версии схемы
+EXTRA_COLUMNS = {
+    "url": "TEXT",
+    "title": "TEXT",
+    "h1": "TEXT",
+    "first_paragraph": "TEXT",
+    "analysis_type": "TEXT",  # "competitor" | "image"
+    "analysis_json": "TEXT",
+}
+
+# Индексы под выборки с сортировкой (timestamp, id) для курсорной пагинации
+INDEXES = """
+DROP INDEX IF EXISTS idx_history_timestamp;
+DROP INDEX IF EXISTS idx_history_type_timestamp;
+CREATE INDEX IF NOT EXISTS idx_history_ts_id ON history (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_history_type_ts_id ON history (request_type, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_history_url_ts_id ON history (url, timestamp DESC, id DESC);
+"""
+
+# Полнотекстовый индекс: rowid совпадает с rowid записи истории.
+# В колонках хранятся основы слов (см. text_search), веса колонок задаются в bm25
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(headline, points, body);
+CREATE TRIGGER IF NOT EXISTS trg_history_fts_delete AFTER DELETE ON history
+BEGIN
+    DELETE FROM history_fts WHERE rowid = OLD.rowid;
+END;
+"""
+SEARCH_WEIGHTS = (3.0, 2.0, 1.0)
+
+# Как часто при добавлении записей удалять записи старше retention_days (сек)
+RETENTION_CHECK_INTERVAL = 600.0
+
+# Колонки для списка (без полного анализа)
+LIST_COLUMNS = "id, timestamp, request_type, request_summary, response_summary, url"
+
+
 class HistoryService:
-    """Управление историей запросов"""
+    """Управление историей запросов (SQLite в режиме WAL)"""
     
     def __init__(self):
         logger.info("=" * 50)
         logger.info("Инициализация History сервиса")
         
-        self.history_file = Path(settings.history_file)
+        self.db_path = Path(settings.history_db)
         self.max_items = settings.max_history_items
+        self.max_stored = settings.history_max_stored
+        self.retention_days = settings.history_retention_days
         
-        logger.info(f"  Файл истории: {self.history_file}")
-        logger.info(f"  Макс. записей: {self.max_items}")
+        logger.info(f"  База истории: {self.db_path}")
+        logger.info(f"  Записей в ответе: {self.max_items}")
+        logger.info(f"  Хранить записей: {self.max_stored}, дней: {self.retention_days or '∞'}")
         
-        self._ensure_file_exists()
+        # Одно соединение на процесс; запись сериализуется блокировкой
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+        self._migrate_json()
+        self._build_search_index()
+        self._next_retention = 0.0
+        self._apply_retention()
         
-        # Загружаем и показываем текущее состояние
-        history = self._load_history()
-        logger.info(f"  Текущих записей: {len(history)}")
+        logger.info(f"  Текущих записей: {self._count()}")
         logger.info("History сервис инициализирован ✓")
         logger.info("=" * 50)
     
-    def _ensure_file_exists(self):
-        """Создать файл истории если его нет"""
-        if not self.history_file.exists():
-            logger.info(f"  📁 Создание файла истории: {self.history_file}")
-            self.history_file.write_text("[]", encoding="utf-8")
-            logger.info("  ✓ Файл создан")
-        else:
-            logger.debug(f"  Файл истории существует: {self.history_file}")
-    
-    def _load_history(self) -> List[dict]:
-        """Загрузить историю из файла"""
+    def _init_schema(self):
+        """Создать таблицы, индексы и триггер ограничения размера"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(history)")}
+            for column, column_type in EXTRA_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE history ADD COLUMN {column} {column_type}")
+            self._conn.executescript(INDEXES)
+            self._conn.executescript(SEARCH_SCHEMA)
+            
+            # Лимит числа записей поддерживает сама база: записи вставляются
+            # в хронологическом порядке, поэтому старые - с меньшим rowid
+            self._conn.execute("DROP TRIGGER IF EXISTS trg_history_retention")
+            self._conn.execute(f"""
+                CREATE TRIGGER trg_history_retention AFTER INSERT ON history
+                BEGIN
+                    DELETE FROM history WHERE rowid <= NEW.rowid - {int(self.max_stored)};
+                END
+            """)
+    
+    def _migrate_json(self):
+        """Однократный перенос записей из старого history.json"""
+        history_file = Path(settings.history_file)
+        if not history_file.exists() or self._count() > 0:
+            return
+        
         try:
-            content = self.history_file.read_text(encoding="utf-8")
-            history = json.loads(content)
-            logger.debug(f"История загружена: {len(history)} записей")
-            return history
-        except json.JSONDecodeError as e:
-            logger.warning(f"Ошибка парсинга JSON истории: {e}")
-            return []
-        except FileNotFoundError:
-            logger.warning(f"Файл истории не найден: {self.history_file}")
-            return []
+            items = json.loads(history_file.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"  Не удалось прочитать {history_file}: {e}")
+            return
+        
+        rows = [
+            (item["id"], item["timestamp"], item["request_type"], item["request_summary"], item["response_summary"])
+            for item in sorted(items, key=lambda item: item["timestamp"])
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO history (id, timestamp, request_type, request_summary, response_summary) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute("COMMIT")
+        logger.info(f"  📦 Перенесено из {history_file}: {len(rows)} записей")
     
-    def _save_history(self, history: List[dict]):
-        """Сохранить историю в файл"""
-        logger.debug(f"Сохранение истории: {len(history)} записей")
-        self.history_file.write_text(
-            json.dumps(history, ensure_ascii=False, indent=2, default=str),
-            encoding="utf-8"
+    @staticmethod
+    def _search_document(row: Dict[str, Any]) -> Tuple[str, str, str]:
+        """Тексты колонок поискового индекса для записи истории"""
+        analysis = json.loads(row["analysis_json"]) if row.get("analysis_json") else {}
+        headline = to_document(
+            row.get("title"),
+            row.get("h1"),
+            analysis.get("summary"),
+            analysis.get("description")
+        )
+        points = to_document(
+            analysis.get("strengths", []),
+            analysis.get("weaknesses", []),
+            analysis.get("unique_offers", []),
+            analysis.get("recommendations", []),
+            analysis.get("marketing_insights", [])
+        )
+        body = to_document(
+            row.get("first_paragraph"),
+            row.get("request_summary"),
+            row.get("response_summary"),
+            analysis.get("visual_style_analysis"),
+            analysis.get("animation_potential")
         )
-        logger.debug("История сохранена ✓")
+        return headline, points, body
+    
+    def _build_search_index(self):
+        """Проиндексировать записи, сохранённые до появления поиска"""
+        with self._lock:
+            indexed = self._conn.execute("SELECT COUNT(*) FROM history_fts").fetchone()[0]
+            if indexed or not self._conn.execute("SELECT 1 FROM history LIMIT 1").fetchone():
+                return
+            
+            start_time = time.time()
+            rows = self._conn.execute("SELECT rowid, * FROM history").fetchall()
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO history_fts (rowid, headline, points, body) VALUES (?, ?, ?, ?)",
+                ((row["rowid"], *self._search_document(dict(row))) for row in rows)
+            )
+            self._conn.execute("COMMIT")
+        logger.info(f"  🔎 Поисковый индекс построен: {len(rows)} записей за {time.time() - start_time:.2f} сек")
+    
+    def _apply_retention(self):
+        """
+        Удалить записи старше retention_days. Вызывается при запуске
+        и при добавлении записей, не чаще раза в RETENTION_CHECK_INTERVAL
+        """
+        if not self.retention_days:
+            return
+        self._next_retention = time.monotonic() + RETENTION_CHECK_INTERVAL
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,)).rowcount
+        if deleted:
+            logger.info(f"  🗑️ Удалено устаревших записей: {deleted}")
+    
+    def _count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
     
     def add_entry(
         self,
         request_type: str,
         request_summary: str,
-        response_summary: str
+        response_summary: str,
+        url: Optional[str] = None,
+        analysis: Optional[BaseModel] = None,
+        title: Optional[str] = None,
+        h1: Optional[str] = None,
+        first_paragraph: Optional[str] = None
     ) -> HistoryItem:
-        """Добавить запись в историю"""
+        """Добавить запись в историю (вместе с полным анализом, если он есть)"""
         logger.info(f"📝 Добавление записи в историю")
         logger.info(f"  Тип: {request_type}")
         logger.info(f"  Запрос: {request_summary[:50]}...")
         logger.info(f"  Ответ: {response_summary[:50]}...")
         
-        history = self._load_history()
-        
         item = {
             "id": str(uuid.uuid4()),
             "timestamp": datetime.now().isoformat(),
             "request_type": request_type,
             "request_summary": request_summary[:200],
-            "response_summary": response_summary[:500]
+            "response_summary": response_summary[:500],
+            "url": url
         }
         
-        # Добавляем в начало
-        history.insert(0, item)
-        old_count = len(history)
-        
-        # Оставляем только последние N записей
-        history = history[:self.max_items]
+        analysis_type = None
+        if isinstance(analysis, ImageAnalysis):
+            analysis_type = "image"
+        elif isinstance(analysis, CompetitorAnalysis):
+            analysis_type = "competitor"
         
-        if old_count > len(history):
-            logger.info(f"  🗑️ Удалено старых записей: {old_count - len(history)}")
+        row = dict(
+            item,
+            title=title,
+            h1=h1,
+            first_paragraph=first_paragraph,
+            analysis_type=analysis_type,
+            analysis_json=analysis.model_dump_json() if analysis is not None else None
+        )
         
-        self._save_history(history)
+        # Запись и её поисковый индекс вставляются одной транзакцией
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                rowid = self._conn.execute(
+                    f"INSERT INTO history ({', '.join(row)}) VALUES ({', '.join(':' + key for key in row)})",
+                    row
+                ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO history_fts (rowid, headline, points, body) VALUES (?, ?, ?, ?)",
+                    (rowid, *self._search_document(row))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
         
         logger.info(f"  ✓ Запись добавлена (ID: {item['id'][:8]}...)")
-        logger.info(f"  Всего записей: {len(history)}")
+        
+        # Лимит числа записей держит триггер, срок хранения - периодическая очистка
+        if time.monotonic() >= self._next_retention:
+            self._apply_retention()
         
         return HistoryItem(**item)
     
+    @staticmethod
+    def _encode_cursor(timestamp: str, item_id: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([timestamp, item_id]).encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, str]:
+        try:
+            timestamp, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return str(timestamp), str(item_id)
+        except Exception:
+            raise ValueError("Некорректный курсор")
+    
+    @staticmethod
+    def _to_db_time(value: datetime) -> str:
+        """Время в формате хранения (локальное, без часового пояса)"""
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value.isoformat()
+    
+    def query(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        request_type: Optional[str] = None,
+        url: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> Tuple[List[HistoryItem], Optional[str]]:
+        """
+        Страница истории от новых к старым.
+        Возвращает (записи, курсор следующей страницы или None).
+        """
+        conditions = []
+        params: Dict[str, Any] = {"limit": limit + 1}
+        
+        if request_type:
+            conditions.append("request_type = :request_type")
+            params["request_type"] = request_type
+        if url:
+            conditions.append("url = :url")
+            params["url"] = url
+        if date_from:
+            conditions.append("timestamp >= :date_from")
+            params["date_from"] = self._to_db_time(date_from)
+        if date_to:
+            conditions.append("timestamp <= :date_to")
+            params["date_to"] = self._to_db_time(date_to)
+        if cursor:
+            params["cursor_ts"], params["cursor_id"] = self._decode_cursor(cursor)
+            conditions.append("(timestamp < :cursor_ts OR (timestamp = :cursor_ts AND id < :cursor_id))")
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT {LIST_COLUMNS} FROM history {where} ORDER BY timestamp DESC, id DESC LIMIT :limit"
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+        
+        return [HistoryItem(**dict(row)) for row in rows], next_cursor
+    
     def get_history(self) -> List[HistoryItem]:
-        """Получить всю историю"""
+        """Получить последние записи истории"""
         logger.info("📋 Получение истории")
-        history = self._load_history()
-        logger.info(f"  Записей: {len(history)}")
-        return [HistoryItem(**item) for item in history]
+        items, _ = self.query(limit=self.max_items)
+        logger.info(f"  Записей: {len(items)}")
+        return items
+    
+    def get_entry(self, entry_id: str) -> Optional[HistoryDetail]:
+        """Полная запись истории с сохранённым анализом"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM history WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        
+        data = dict(row)
+        analysis_json = data.pop("analysis_json", None)
+        analysis_type = data.pop("analysis_type", None)
+        analysis = None
+        if analysis_json:
+            model = ImageAnalysis if analysis_type == "image" else CompetitorAnalysis
+            analysis = model.model_validate_json(analysis_json)
+        
+        return HistoryDetail(**data, analysis=analysis)
+    
+    def search(
+        self,
+        query: str,
+        limit: int,
+        request_type: Optional[str] = None,
+        match_all: bool = True
+    ) -> List[HistorySearchHit]:
+        """
+        Полнотекстовый поиск по сохранённым анализам (основы русских слов, ранжирование bm25).
+        match_all=False - достаточно совпадения любого слова запроса.
+        """
+        match = to_match_query(query, match_all=match_all)
+        if match is None:
+            return []
+        
+        params: Dict[str, Any] = {"match": match, "limit": limit}
+        type_filter = ""
+        if request_type:
+            type_filter = "AND h.request_type = :request_type"
+            params["request_type"] = request_type
+        
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        sql = f"""
+            SELECT {', '.join('h.' + column.strip() for column in LIST_COLUMNS.split(','))},
+                   -bm25(history_fts, {weights}) AS score
+            FROM history_fts
+            JOIN history h ON h.rowid = history_fts.rowid
+            WHERE history_fts MATCH :match {type_filter}
+            ORDER BY score DESC
+            LIMIT :limit
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [HistorySearchHit(**dict(row)) for row in rows]
     
     def clear_history(self):
         """Очистить историю"""
         logger.info("🗑️ Очистка истории")
-        old_history = self._load_history()
-        logger.info(f"  Удаляется записей: {len(old_history)}")
-        
-        self._save_history([])
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM history").rowcount
+        logger.info(f"  Удалено записей: {deleted}")
         
         logger.info("  ✓ История очищена")
+    
+    def close(self):
+        """Закрыть соединение с базой"""
+        self._conn.close()
 
 
 # Глобальный экземпляр
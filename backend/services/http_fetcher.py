@@ -0,0 +1,180 @@
+"""
+Быстрое получение текста страницы по HTTP без браузера
+"""
+import re
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import httpx
+from bs4 import BeautifulSoup
+
+from backend.config import settings
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.http_fetcher")
+
+# Признаки SPA: пустой корневой контейнер фреймворка
+SPA_ROOT_RE = re.compile(
+    rb'<div[^>]+id=["\'](?:root|app|__next|__nuxt)["\'][^>]*>\s*</div>',
+    re.IGNORECASE
+)
+
+
+# Цены в тексте страницы (регулярное выражение совместимо с JavaScript)
+PRICE_PATTERN = r"(?:от\s*)?\d{1,3}(?:[ \u00a0]?\d{3})*(?:[.,]\d{1,2})?\s?(?:₽|руб\.?|р\.|RUB|€|\$)"
+PRICE_RE = re.compile(PRICE_PATTERN, re.IGNORECASE)
+
+
+def _clean(text: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def extract_text(
+    html: bytes,
+    encoding: Optional[str] = None,
+    max_paragraphs: int = 5,
+    max_prices: int = 10,
+    base_url: Optional[str] = None,
+    max_links: int = 0
+) -> Tuple[Dict[str, Any], int]:
+    """
+    Извлечь поля страницы по тем же правилам, что и скрипт в браузере.
+    Возвращает (поля, длина видимого текста). Без кодировки из заголовков
+    BeautifulSoup определяет её по <meta charset>.
+    max_links > 0 - также ссылки страницы [(абсолютный URL, текст)] относительно base_url
+    """
+    soup = BeautifulSoup(html, "lxml", from_encoding=encoding)
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+
+    h1_tag = soup.find("h1")
+    paragraphs = []
+    for p in soup.find_all("p"):
+        text = _clean(p.get_text(" "))
+        if len(text) > 50:
+            paragraphs.append(text)
+            if len(paragraphs) >= max_paragraphs:
+                break
+
+    meta = soup.find("meta", attrs={"name": re.compile("^description$", re.IGNORECASE)})
+    og: Dict[str, str] = {}
+    for tag in soup.find_all("meta", attrs={"property": re.compile("^og:")}):
+        key = tag["property"][3:]
+        if key and key not in og:
+            og[key] = _clean(tag.get("content"))
+
+    links: List[Tuple[str, str]] = []
+    if max_links > 0:
+        seen = set()
+        for anchor in soup.find_all("a", href=True):
+            href = urljoin(base_url or "", anchor["href"].strip())
+            if href in seen:
+                continue
+            seen.add(href)
+            links.append((href, _clean(anchor.get_text(" ") or anchor.get("title"))))
+            if len(links) >= max_links:
+                break
+
+    body_text = _clean((soup.body or soup).get_text(" "))
+    prices: List[str] = []
+    for match in PRICE_RE.finditer(body_text):
+        price = _clean(match.group())
+        if price not in prices:
+            prices.append(price)
+            if len(prices) >= max_prices:
+                break
+
+    data = {
+        "title": _clean(soup.title.get_text(" ")) if soup.title else None,
+        "h1": _clean(h1_tag.get_text(" ")) if h1_tag else None,
+        "paragraphs": paragraphs,
+        "meta_description": _clean(meta.get("content")) if meta else None,
+        "og": og,
+        "prices": prices,
+        "links": links,
+    }
+    return data, len(body_text)
+
+
+class HttpFetcher:
+    """
+    Загрузка HTML общим пулом соединений httpx.
+    Не заменяет браузер: если страница рендерится скриптами
+    или запрос не удался, возвращает None, и парсер переходит на Chrome.
+    """
+
+    def __init__(self, fields: List[str], max_paragraphs: int, max_prices: int):
+        logger.info("=" * 50)
+        logger.info("Инициализация HTTP fetcher")
+
+        self.fields = fields
+        self.max_paragraphs = max_paragraphs
+        self.max_prices = max_prices
+        self.min_text_length = settings.parser_http_min_text_length
+        self.max_bytes = settings.parser_http_max_bytes
+        self._client = httpx.AsyncClient(
+            headers={
+                "User-Agent": settings.parser_user_agent,
+                "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+            },
+            timeout=httpx.Timeout(settings.parser_http_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.parser_http_max_connections,
+                max_keepalive_connections=settings.parser_http_max_connections
+            ),
+            follow_redirects=True
+        )
+
+        logger.info(f"  Timeout: {settings.parser_http_timeout} сек")
+        logger.info(f"  Макс. соединений: {settings.parser_http_max_connections}")
+        logger.info("HTTP fetcher инициализирован ✓")
+        logger.info("=" * 50)
+
+    async def fetch(self, url: str, timings: Dict[str, float], timeout: Optional[float] = None,
+                    max_links: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Получить поля страницы или None, если нужен браузер (timeout - свой таймаут сайта).
+        max_links > 0 - добавить ссылки страницы (поле links) для обхода сайта
+        """
+        stage_start = time.time()
+        request_timeout = httpx.Timeout(timeout) if timeout else httpx.USE_CLIENT_DEFAULT
+        try:
+            async with self._client.stream("GET", url, timeout=request_timeout) as response:
+                content_type = response.headers.get("content-type", "")
+                if response.status_code >= 400 or "html" not in content_type:
+                    logger.info(f"  HTTP {response.status_code} ({content_type or 'без типа'}) - нужен браузер")
+                    return None
+
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_bytes:
+                        break
+                html = b"".join(chunks)
+                encoding = response.charset_encoding
+                final_url = str(response.url)
+        except httpx.HTTPError as e:
+            logger.info(f"  HTTP загрузка не удалась ({type(e).__name__}) - нужен браузер")
+            return None
+        timings["fetch"] = time.time() - stage_start
+
+        stage_start = time.time()
+        data, text_length = await asyncio.to_thread(
+            extract_text, html, encoding, self.max_paragraphs, self.max_prices, final_url, max_links
+        )
+        timings["extract"] = time.time() - stage_start
+
+        if SPA_ROOT_RE.search(html) or text_length < self.min_text_length or not (data["h1"] or data["paragraphs"]):
+            logger.info(f"  Страница рендерится скриптами (текста: {text_length} символов) - нужен браузер")
+            return None
+        fields = self.fields + ["links"] if max_links > 0 else self.fields
+        return {field: value for field, value in data.items() if field in fields}
+
+    async def close(self):
+        await self._client.aclose()
@@ -0,0 +1,105 @@
+"""
+Подготовка изображений перед отправкой в Vision модель
+"""
+import asyncio
+import base64
+import io
+import time
+import logging
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+from backend.config import settings
+from backend.services.tracing import tracer
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.image")
+
+# Тег EXIF с ориентацией снимка (1 - без поворота)
+EXIF_ORIENTATION = 0x0112
+
+# Формат вывода -> (формат Pillow, MIME тип)
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+class ImageService:
+    """Уменьшение и пережатие изображений (скриншоты и загрузки)"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Image сервиса")
+
+        self.max_edge = settings.image_max_edge
+        self.quality = settings.image_quality
+        self.pil_format, self.mime_type = OUTPUT_FORMATS.get(
+            settings.image_output_format.lower(), OUTPUT_FORMATS["jpeg"]
+        )
+
+        logger.info(f"  Макс. сторона: {self.max_edge}px")
+        logger.info(f"  Формат: {self.mime_type}, качество {self.quality}")
+        logger.info("Image сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    def prepare(self, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """
+        Уменьшить изображение до max_edge по большей стороне и пережать.
+        Возвращает (байты, MIME тип). Если пережатие не уменьшает размер,
+        возвращается оригинал.
+        """
+        start_time = time.time()
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:
+            logger.warning(f"  ⚠ Не удалось открыть изображение, отправляем как есть: {e}")
+            return data, mime_type
+
+        # Фото с телефона повёрнуты тегом EXIF Orientation, а при пережатии
+        # EXIF теряется - поворачиваем пиксели заранее
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if rotated:
+            image = ImageOps.exif_transpose(image)
+
+        original_size = image.size
+        resized = max(image.size) > self.max_edge
+        if resized:
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+
+        # JPEG не поддерживает прозрачность - кладём на белый фон
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.pil_format, quality=self.quality, optimize=True)
+        prepared = buffer.getvalue()
+
+        if not resized and not rotated and len(prepared) >= len(data):
+            logger.debug("  Пережатие не уменьшило размер, оставляем оригинал")
+            return data, mime_type
+
+        elapsed = time.time() - start_time
+        logger.info(
+            f"  🗜️ Изображение {original_size[0]}x{original_size[1]} -> {image.size[0]}x{image.size[1]}, "
+            f"{len(data) / 1024:.1f} KB -> {len(prepared) / 1024:.1f} KB за {elapsed:.2f} сек"
+        )
+        return prepared, self.mime_type
+
+    async def encode(self, data: bytes, mime_type: str) -> Tuple[str, str]:
+        """Подготовить изображение в потоке и вернуть (base64, MIME тип)"""
+        with tracer.span("image.encode", **{"image.bytes": len(data)}):
+            prepared, prepared_mime = await asyncio.to_thread(self.prepare, data, mime_type)
+        return base64.b64encode(prepared).decode('utf-8'), prepared_mime
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Image сервиса...")
+image_service = ImageService()
@@ -0,0 +1,250 @@
+"""
+Фоновая очередь задач для долгих анализов
+"""
+import asyncio
+import uuid
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional
+
+from pydantic import BaseModel
+
+from backend.config import settings
+from backend.models.schemas import JobInfo
+from backend.services.rate_limiter import PRIORITY_BACKGROUND, request_priority
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.jobs")
+
+# Статусы задач
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """Задача отклонена: в очереди и в работе уже jobs_max_pending задач"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"Очередь задач заполнена ({limit}), повторите позже")
+
+
+class Job:
+    """Задача в очереди"""
+
+    def __init__(self, job_type: str, factory: Callable[[], Awaitable[Any]]):
+        self.id = str(uuid.uuid4())
+        self.job_type = job_type
+        self.factory = factory
+        self.status = JOB_QUEUED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def set_status(self, status: str):
+        """Сменить статус и разбудить подписчиков"""
+        self.status = status
+        if status == JOB_RUNNING:
+            self.started_at = datetime.now()
+        elif status in FINISHED_STATUSES:
+            self.finished_at = datetime.now()
+            # Ссылка на корутину больше не нужна
+            self.factory = None
+
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_changed(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться следующей смены статуса"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_info(self) -> JobInfo:
+        result = self.result
+        if isinstance(result, BaseModel):
+            result = result.model_dump(mode="json")
+        return JobInfo(
+            id=self.id,
+            job_type=self.job_type,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            result=result,
+            error=self.error
+        )
+
+
+class JobService:
+    """
+    Очередь фоновых задач с пулом воркеров.
+
+    Задача выполняется независимо от HTTP запроса, поэтому переживает
+    отключение клиента. Результаты хранятся в памяти процесса,
+    старые завершённые задачи вытесняются после jobs_max_retained.
+    Незавершённых задач (в очереди и в работе) - не больше jobs_max_pending,
+    сверх лимита submit выбрасывает JobQueueFullError.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Job сервиса")
+
+        self.max_workers = max(1, settings.jobs_max_workers)
+        self.max_retained = max(1, settings.jobs_max_retained)
+        self.max_pending = max(1, settings.jobs_max_pending)
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+        logger.info(f"  Воркеров: {self.max_workers}")
+        logger.info(f"  Хранить задач: {self.max_retained}")
+        logger.info(f"  Незавершённых задач: не больше {self.max_pending}")
+        logger.info("Job сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    @property
+    def queue_size(self) -> int:
+        """Количество задач, ожидающих воркера"""
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def pending(self) -> int:
+        """Количество незавершённых задач (в очереди и в работе)"""
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    @property
+    def full(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def start(self):
+        """Запустить воркеры (повторный вызов ничего не делает)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.ensure_future(self._worker(i)) for i in range(1, self.max_workers + 1)
+        ]
+        logger.info(f"🟢 Запущено воркеров задач: {len(self._workers)}")
+
+    async def stop(self):
+        """Остановить воркеры и отменить незавершённые задачи"""
+        for job in self._jobs.values():
+            if not job.finished:
+                self.cancel(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        logger.info("Воркеры задач остановлены ✓")
+
+    def submit(self, job_type: str, factory: Callable[[], Awaitable[Any]]) -> Job:
+        """Поставить задачу в очередь и сразу вернуть её (JobQueueFullError - очередь заполнена)"""
+        if self.full:
+            logger.warning(f"⚠️ Задача {job_type} отклонена: незавершённых задач {self.pending}")
+            raise JobQueueFullError(self.max_pending)
+        self.start()
+
+        job = Job(job_type, factory)
+        self._jobs[job.id] = job
+        self._evict()
+        self._queue.put_nowait(job)
+
+        logger.info(f"📥 Задача {job.id[:8]} ({job_type}) в очереди, ожидают: {self._queue.qsize()}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        """Задачи от новых к старым"""
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Отменить задачу в очереди или в работе"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        if job.status == JOB_QUEUED:
+            # Воркер пропустит задачу, когда дойдёт до неё
+            job.set_status(JOB_CANCELLED)
+        elif job.task is not None:
+            job.task.cancel()
+
+        logger.info(f"🛑 Задача {job.id[:8]} отменена")
+        return job
+
+    def _evict(self):
+        """Удалить самые старые завершённые задачи сверх лимита"""
+        excess = len(self._jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished][:excess]:
+            del self._jobs[job_id]
+
+    async def _worker(self, number: int):
+        """Воркер: берёт задачи из очереди по одной"""
+        # Задачи наследуют контекст воркера: вызовы модели идут с фоновым приоритетом
+        request_priority.set(PRIORITY_BACKGROUND)
+        while True:
+            job: Job = await self._queue.get()
+            try:
+                if job.status != JOB_QUEUED:
+                    continue
+                await self._run(job, number)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job, number: int):
+        """Выполнить задачу в отдельной asyncio задаче, чтобы её можно было отменить"""
+        logger.info(f"▶️ Воркер {number}: задача {job.id[:8]} ({job.job_type})")
+        job.set_status(JOB_RUNNING)
+        job.task = asyncio.ensure_future(job.factory())
+
+        # wait не пробрасывает отмену внутренней задачи
+        await asyncio.wait({job.task})
+
+        if job.task.cancelled():
+            job.set_status(JOB_CANCELLED)
+        elif job.task.exception() is not None:
+            job.error = str(job.task.exception())
+            logger.error(f"  ✗ Задача {job.id[:8]} завершилась ошибкой: {job.error}")
+            job.set_status(JOB_FAILED)
+        else:
+            job.result = job.task.result()
+            # Эндпоинты сообщают об ошибке в ответе (success=False), а не исключением
+            if getattr(job.result, "success", True) is False:
+                job.error = getattr(job.result, "error", None) or "Задача завершилась неуспешно"
+                logger.error(f"  ✗ Задача {job.id[:8]} завершилась ошибкой: {job.error}")
+                job.set_status(JOB_FAILED)
+            else:
+                job.set_status(JOB_SUCCEEDED)
+
+        elapsed = (job.finished_at - job.started_at).total_seconds()
+        logger.info(f"  ✓ Задача {job.id[:8]}: {job.status} за {elapsed:.2f} сек")
+        job.task = None
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Job сервиса...")
+job_service = JobService()
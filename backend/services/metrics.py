@@ -0,0 +1,175 @@
+"""
+Метрики в текстовом формате Prometheus (без внешних зависимостей)
+"""
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Границы корзин гистограмм (сек)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+MODEL_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Сэмпл коллектора: (имя метрики, метки, значение)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Метрика с метками; значения хранятся по кортежу значений меток"""
+
+    type_name = ""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Гистограмма длительностей с накопительными корзинами"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Значение: (счётчики корзин, сумма, количество)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик. Помимо собственных счётчиков и гистограмм принимает
+    коллекторы - функции, которые в момент запроса /metrics читают
+    текущее состояние сервисов (размеры очередей, статистику кэша).
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, description, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = HTTP_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, type_name: str, description: str,
+                           collect: Callable[[], Iterable[Sample]]):
+        """Метрика, значения которой вычисляются при каждом запросе"""
+        self._collectors.append((name, type_name, description, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, type_name, description, collect in self._collectors:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for sample_name, labels, value in collect():
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр и метрики, которые пишут сервисы
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Длительность HTTP запросов",
+    ("method", "route", "status")
+)
+parser_stage_duration = metrics.histogram(
+    "parser_stage_duration_seconds", "Длительность этапов парсинга страницы",
+    ("stage", "method"), STAGE_BUCKETS
+)
+model_call_duration = metrics.histogram(
+    "model_call_duration_seconds", "Длительность вызова модели (одна попытка)",
+    ("model", "outcome"), MODEL_BUCKETS
+)
+model_tokens = metrics.counter(
+    "model_tokens_total", "Токены, израсходованные моделью (по usage)",
+    ("model", "kind")
+)
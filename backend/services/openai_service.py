@@ -2,21 +2,66 @@
 Сервис для работы с OpenRouter API (Google Gemini)
 https://openrouter.ai/docs
 """
-import base64
+import asyncio
 import json
+import random
 import re
 import time
 import logging
-from typing import Optional
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
 
 from backend.config import settings
 from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
+from backend.services.cache_service import analysis_cache
+from backend.services.circuit_breaker import CircuitBreaker
+from backend.services.rate_limiter import RateLimiter
+from backend.services.metrics import model_call_duration, model_tokens
+from backend.services.tracing import tracer
 
 # Логгер для сервиса
 logger = logging.getLogger("competitor_monitor.openai")
 
+# HTTP статусы, после которых вызов имеет смысл повторить
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Временная ошибка: перегрузка, сбой сервера или сети"""
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES
+    return isinstance(error, APIConnectionError)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Пауза из заголовков Retry-After / retry-after-ms (сек)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
 class OpenAIService:
     """Сервис для анализа через OpenRouter"""
@@ -29,17 +74,161 @@ class OpenAIService:
         logger.info(f"  Модель vision: {settings.openai_vision_model}")
         logger.info(f"  API ключ: {'*' * 10}...{settings.openrouter_api_key[-4:] if settings.openrouter_api_key else 'НЕ ЗАДАН'}")
         
+        logger.info(f"  Таймаут вызова: {settings.openai_timeout} сек")
+        logger.info(f"  Макс. параллельных вызовов: {settings.openai_max_concurrency}")
+        
+        # Общий пул соединений для всех вызовов модели
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_connections
+            ),
+            timeout=httpx.Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout)
+        )
+        
         # OpenRouter - OpenAI-совместимый API для различных моделей
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             api_key=settings.openrouter_api_key,
-            base_url=settings.openrouter_base_url
+            base_url=settings.openrouter_base_url,
+            http_client=self._http_client,
+            # Повторы выполняет сервис (с учётом выключателя), а не SDK
+            max_retries=0
         )
         self.model = settings.openai_model
         self.vision_model = settings.openai_vision_model
+        self.timeout = settings.openai_timeout
+        
+        # Общий лимит вызовов модели: параллелизм, RPM и TPM с приоритетами
+        self._limiter = RateLimiter(
+            max_concurrency=settings.openai_max_concurrency,
+            rpm=settings.openai_rpm_limit,
+            tpm=settings.openai_tpm_limit
+        )
+        logger.info(f"  Лимит запросов/мин: {settings.openai_rpm_limit or '∞'}, токенов/мин: {settings.openai_tpm_limit or '∞'}")
         
+        # Повторы временных ошибок и выключатель на каждую модель
+        self.max_retries = settings.openai_max_retries
+        self.retry_base_delay = settings.openai_retry_base_delay
+        self.retry_max_delay = settings.openai_retry_max_delay
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        
+        logger.info(f"  Повторов при временных ошибках: {self.max_retries}")
+        logger.info(f"  Выключатель: {settings.openai_breaker_failure_threshold} сбоев подряд, "
+                    f"пауза {settings.openai_breaker_reset_timeout} сек")
         logger.info("OpenAI сервис инициализирован успешно ✓")
         logger.info("=" * 50)
     
+    def _breaker(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                model,
+                failure_threshold=settings.openai_breaker_failure_threshold,
+                reset_timeout=settings.openai_breaker_reset_timeout
+            )
+            self._breakers[model] = breaker
+        return breaker
+    
+    @staticmethod
+    def _estimate_tokens(kwargs: dict) -> int:
+        """Оценка расхода токенов вызова до получения usage"""
+        chars = 0
+        images = 0
+        for message in kwargs.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, str):
+                chars += len(content)
+                continue
+            for part in content or []:
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    chars += len(part.get("text", ""))
+        completion = kwargs.get("max_tokens") or settings.openai_completion_token_estimate
+        return chars // 3 + images * settings.openai_image_token_estimate + completion
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """
+        Пауза перед повтором: Retry-After сервера или экспоненциальная
+        со случайным разбросом (full jitter). None - не повторять.
+        """
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # Сервер просит ждать дольше допустимого - не держим запрос
+            return retry_after if retry_after <= self.retry_max_delay else None
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+    
+    async def _create_completion(self, **kwargs):
+        """
+        Вызов chat.completions через общий ограничитель (параллелизм, RPM, TPM,
+        приоритет задачи) и с таймаутом.
+        Временные ошибки (429, 5xx, сеть) повторяются с паузой; если модель
+        сбоит подряд, выключатель сразу отклоняет вызовы (CircuitOpenError)
+        """
+        model = kwargs["model"]
+        breaker = self._breaker(model)
+        attempt = 0
+        while True:
+            breaker.before_call()
+            reservation = None
+            call_start = None
+            try:
+                reservation = await self._limiter.acquire(self._estimate_tokens(kwargs))
+                call_start = time.time()
+                with tracer.span("model.call", **{"model": model, "attempt": attempt}) as span:
+                    response = await self.client.chat.completions.create(
+                        timeout=self.timeout,
+                        **kwargs
+                    )
+                    usage = getattr(response, "usage", None)
+                    if span and usage:
+                        span.set_attribute("tokens.prompt", usage.prompt_tokens)
+                        span.set_attribute("tokens.completion", usage.completion_tokens)
+                model_call_duration.observe(time.time() - call_start, model=model, outcome="success")
+                reservation.settle(usage.total_tokens if usage else None)
+                if usage:
+                    model_tokens.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+                    model_tokens.inc(usage.completion_tokens or 0, model=model, kind="completion")
+            except Exception as e:
+                if call_start is not None:
+                    model_call_duration.observe(time.time() - call_start, model=model, outcome="error")
+                if reservation is not None:
+                    if isinstance(e, APIStatusError):
+                        # Сервер ответил ошибкой - токены не израсходованы
+                        reservation.settle(0)
+                    # Слот не держим во время паузы перед повтором
+                    reservation.release()
+                if not _is_retryable(e):
+                    # Ошибка запроса (400, 401...) - сервис при этом отвечает
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                
+                delay = self._retry_delay(attempt, e) if attempt < self.max_retries else None
+                if delay is None:
+                    raise
+                attempt += 1
+                breaker.record_retry()
+                logger.warning(f"  ↻ {type(e).__name__}, повтор {attempt}/{self.max_retries} через {delay:.2f} сек")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.record_cancel()
+                raise
+            finally:
+                if reservation is not None:
+                    reservation.release()
+            
+            breaker.record_success()
+            return response
+    
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Метрики вызовов: лимиты и очередь, по моделям - повторы, сбои, срабатывания выключателя"""
+        return {
+            "limiter": self._limiter.stats(),
+            "models": {model: breaker.stats() for model, breaker in self._breakers.items()}
+        }
+    
     def _parse_json_response(self, content: str) -> dict:
         """Извлечь JSON из ответа модели"""
         logger.debug(f"Парсинг JSON ответа, длина: {len(content)} символов")
@@ -65,6 +254,7 @@ class OpenAIService:
             logger.debug(f"Проблемный контент: {content[:200]}...")
             return {}
     
+    @tracer.traced("model.analyze_text")
     async def analyze_text(self, text: str) -> CompetitorAnalysis:
         """Анализ текста через LLM"""
         logger.info(f" Анализ текста ({len(text)} символов)...")
@@ -96,12 +286,19 @@ class OpenAIService:
         - Пиши на русском языке.
         """
 
+        text = text[:10000]  # Ограничиваем длину
+        cache_key = analysis_cache.make_key("text", self.model, system_prompt, text)
+        cached = await analysis_cache.get(cache_key)
+        if cached is not None:
+            logger.info(" ⚡ Результат из кэша")
+            return CompetitorAnalysis(**cached)
+
         try:
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Проанализируй этот текст сайта глэмпинга:\n\n{text[:10000]}"}  # Ограничиваем длину
+                    {"role": "user", "content": f"Проанализируй этот текст сайта глэмпинга:\n\n{text}"}
                 ],
                 response_format={"type": "json_object"},
                 temperature=0.7,
@@ -113,7 +310,7 @@ class OpenAIService:
             content = response.choices[0].message.content
             data = self._parse_json_response(content)
 
-            return CompetitorAnalysis(
+            result = CompetitorAnalysis(
                 strengths=data.get("strengths", []),
                 weaknesses=data.get("weaknesses", []),
                 unique_offers=data.get("unique_offers", []),
@@ -122,11 +319,14 @@ class OpenAIService:
                 design_score=data.get("design_score", 5),
                 animation_potential=data.get("animation_potential", "")
             )
+            await analysis_cache.set(cache_key, result.model_dump())
+            return result
 
         except Exception as e:
             logger.error(f" ✗ Ошибка LLM: {e}")
             raise
 
+    @tracer.traced("model.analyze_image")
     async def analyze_image(self, image_base64: str, mime_type: str = "image/jpeg") -> ImageAnalysis:
         """Анализ изображения (баннер, сайт, упаковка)"""
         logger.info("=" * 50)
@@ -150,11 +350,18 @@ class OpenAIService:
         Будьте критичны, но конструктивны. Фокус на «дороговизне» и «уюте».
         """
 
+        cache_key = analysis_cache.make_key("image", self.vision_model, system_prompt, mime_type, image_base64)
+        cached = await analysis_cache.get(cache_key)
+        if cached is not None:
+            logger.info("  ⚡ Результат из кэша")
+            logger.info("=" * 50)
+            return ImageAnalysis(**cached)
+        
         start_time = time.time()
         logger.info("  Отправка запроса к Vision API...")
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.vision_model,
                 messages=[
                     {
@@ -196,6 +403,8 @@ class OpenAIService:
                 animation_potential=data.get("animation_potential", "")
             )
             
+            await analysis_cache.set(cache_key, result.model_dump())
+            
             logger.info(f"  Результат: оценка стиля {result.design_score}/10")
             logger.info(f"  Инсайтов: {len(result.marketing_insights)}, рекомендаций: {len(result.recommendations)}")
             logger.info("=" * 50)
@@ -207,13 +416,16 @@ class OpenAIService:
             logger.error(f"  ✗ Ошибка Vision API за {elapsed:.2f} сек: {e}")
             logger.error("=" * 50)
             raise
+    
+    @tracer.traced("model.analyze_parsed_content")
     async def analyze_parsed_content(
         self, 
         title: Optional[str], 
         h1: Optional[str], 
-        paragraph: Optional[str]
+        paragraph: Optional[str],
+        site_text: Optional[str] = None
     ) -> CompetitorAnalysis:
-        """Анализ распарсенного контента сайта"""
+        """Анализ распарсенного контента сайта (site_text - текст нескольких страниц при обходе)"""
         logger.info("📄 Анализ распарсенного контента")
         logger.info(f"  Title: {title[:50] if title else 'N/A'}...")
         logger.info(f"  H1: {h1[:50] if h1 else 'N/A'}...")
@@ -226,6 +438,8 @@ class OpenAIService:
             content_parts.append(f"Главный заголовок (H1): {h1}")
         if paragraph:
             content_parts.append(f"Первый абзац: {paragraph}")
+        if site_text:
+            content_parts.append(f"Содержимое страниц сайта:\n{site_text}")
         
         combined_text = "\n\n".join(content_parts)
         
@@ -237,21 +451,27 @@ class OpenAIService:
         
         return await self.analyze_text(combined_text)
     
+    @tracer.traced("model.analyze_website_screenshot")
     async def analyze_website_screenshot(
         self,
         screenshot_base64: str,
         url: str,
         title: Optional[str] = None,
         h1: Optional[str] = None,
-        first_paragraph: Optional[str] = None
+        first_paragraph: Optional[str] = None,
+        mime_type: str = "image/jpeg",
+        site_text: Optional[str] = None
     ) -> CompetitorAnalysis:
-        """Комплексный анализ сайта конкурента по скриншоту"""
+        """
+        Комплексный анализ сайта конкурента по скриншоту
+        (site_text - текст внутренних страниц при обходе сайта)
+        """
         logger.info("=" * 50)
         logger.info("🌐 КОМПЛЕКСНЫЙ АНАЛИЗ САЙТА")
         logger.info(f"  URL: {url}")
         logger.info(f"  Title: {title[:50] if title else 'N/A'}...")
         logger.info(f"  H1: {h1[:50] if h1 else 'N/A'}...")
-        logger.info(f"  Размер скриншота: {len(screenshot_base64)} символов base64")
+        logger.info(f"  Размер скриншота: {len(screenshot_base64)} символов base64 ({mime_type})")
         logger.info(f"  Модель: {self.vision_model}")
         
         # Формируем контекст из извлечённых данных
@@ -262,6 +482,8 @@ class OpenAIService:
             context_parts.append(f"Главный заголовок (H1): {h1}")
         if first_paragraph:
             context_parts.append(f"Текст на странице: {first_paragraph[:300]}")
+        if site_text:
+            context_parts.append(f"Содержимое страниц сайта:\n{site_text}")
         
         context = "\n".join(context_parts)
         logger.debug(f"  Контекст:\n{context}")
@@ -291,11 +513,18 @@ class OpenAIService:
 - Будь конкретен и практичен
 - Давай actionable рекомендации"""
 
+        cache_key = analysis_cache.make_key("screenshot", self.vision_model, system_prompt, context, mime_type, screenshot_base64)
+        cached = await analysis_cache.get(cache_key)
+        if cached is not None:
+            logger.info("  ⚡ Результат из кэша")
+            logger.info("=" * 50)
+            return CompetitorAnalysis(**cached)
+        
         start_time = time.time()
         logger.info("  Отправка скриншота в Vision API...")
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.vision_model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -309,7 +538,7 @@ class OpenAIService:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{screenshot_base64}"
+                                    "url": f"data:{mime_type};base64,{screenshot_base64}"
                                 }
                             }
                         ]
@@ -335,6 +564,8 @@ class OpenAIService:
                 summary=data.get("summary", "")
             )
             
+            await analysis_cache.set(cache_key, result.model_dump())
+            
             logger.info(f"  Результат:")
             logger.info(f"    - Сильных сторон: {len(result.strengths)}")
             logger.info(f"    - Слабых сторон: {len(result.weaknesses)}")
@@ -350,6 +581,12 @@ class OpenAIService:
             logger.error(f"  ✗ Ошибка Vision API за {elapsed:.2f} сек: {e}")
             logger.error("=" * 50)
             raise
+    
+    async def close(self):
+        """Закрыть пул HTTP соединений"""
+        logger.info("Закрытие OpenAI сервиса...")
+        await self.client.close()
+        logger.info("OpenAI сервис закрыт ✓")
 
 
 # Глобальный экземпляр
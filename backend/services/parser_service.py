@@ -1,11 +1,14 @@
 """
 Сервис для парсинга веб-страниц через Selenium Chrome
+(с быстрым HTTP режимом для страниц, где не нужен скриншот)
 """
 import base64
 import asyncio
+import contextvars
+import functools
 import time
 import logging
-from typing import Optional, Tuple, List
+from typing import Any, Callable, Dict, Optional, Tuple, List
 from concurrent.futures import ThreadPoolExecutor
 
 from selenium import webdriver
@@ -15,13 +18,169 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 
 from backend.config import settings
+from backend.services.driver_pool import DriverPool
+from backend.services.chromedriver_resolver import chromedriver_resolver
+from backend.services.http_fetcher import HttpFetcher, PRICE_PATTERN
+from backend.services.crawl_scheduler import CrawlScheduler, interleave_by_host
+from backend.services.site_crawler import aggregate_text, crawl_budget, select_links
+from backend.services.metrics import parser_stage_duration
+from backend.services.rate_limiter import PRIORITY_BACKGROUND, request_priority
+from backend.services.tracing import tracer
+from backend.services.competitor_service import competitor_service
 
 # Логгер для сервиса
 logger = logging.getLogger("competitor_monitor.parser")
 
+# Размер окна Chrome (и скриншота) по умолчанию
+DEFAULT_VIEWPORT = (1920, 1080)
+
+# Скрипт готовности страницы: счётчик DOM мутаций (наблюдатель ставится один раз)
+# и количество загруженных ресурсов
+READINESS_SCRIPT = """
+if (!window.__cmReadiness) {
+    window.__cmReadiness = {mutations: 0};
+    new MutationObserver(function (records) {
+        window.__cmReadiness.mutations += records.length;
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return [
+    document.readyState,
+    window.__cmReadiness.mutations,
+    performance.getEntriesByType('resource').length
+];
+"""
+
+# Извлечение данных страницы за один вызов WebDriver.
+# arguments[0] - набор полей, arguments[1] - макс. абзацев, arguments[2] - макс. цен,
+# arguments[3] - шаблон цены, arguments[4] - макс. ссылок (поле links, для обхода сайта)
+EXTRACTION_SCRIPT = """
+var fields = arguments[0], maxParagraphs = arguments[1], maxPrices = arguments[2], maxLinks = arguments[4] || 0;
+var want = function (name) { return fields.indexOf(name) !== -1; };
+var clean = function (text) { return (text || '').replace(/\\s+/g, ' ').trim(); };
+var result = {};
+if (want('title')) {
+    result.title = document.title;
+}
+if (want('h1')) {
+    var h1 = document.querySelector('h1');
+    result.h1 = h1 ? clean(h1.innerText) : null;
+}
+if (want('paragraphs')) {
+    result.paragraphs = [];
+    var nodes = document.getElementsByTagName('p');
+    for (var i = 0; i < nodes.length && result.paragraphs.length < maxParagraphs; i++) {
+        var text = clean(nodes[i].innerText);
+        if (text.length > 50) {
+            result.paragraphs.push(text);
+        }
+    }
+}
+if (want('meta_description')) {
+    var meta = document.querySelector('meta[name="description" i]');
+    result.meta_description = meta ? clean(meta.getAttribute('content')) : null;
+}
+if (want('og')) {
+    result.og = {};
+    document.querySelectorAll('meta[property^="og:"]').forEach(function (tag) {
+        var key = tag.getAttribute('property').slice(3);
+        if (key && !(key in result.og)) {
+            result.og[key] = clean(tag.getAttribute('content'));
+        }
+    });
+}
+if (want('prices')) {
+    var text = document.body ? document.body.innerText : '';
+    var matches = text.match(new RegExp(arguments[3], 'gi')) || [];
+    var seen = {};
+    result.prices = [];
+    for (var j = 0; j < matches.length && result.prices.length < maxPrices; j++) {
+        var price = clean(matches[j]);
+        if (!seen[price]) {
+            seen[price] = true;
+            result.prices.push(price);
+        }
+    }
+}
+if (want('links')) {
+    var anchors = document.querySelectorAll('a[href]');
+    var seenLinks = {};
+    result.links = [];
+    for (var k = 0; k < anchors.length && result.links.length < maxLinks; k++) {
+        var href = anchors[k].href;
+        if (!seenLinks[href]) {
+            seenLinks[href] = true;
+            result.links.push([href, clean(anchors[k].innerText || anchors[k].title)]);
+        }
+    }
+}
+return result;
+"""
+
+
+class PageParseResult:
+    """Результат парсинга страницы вместе с замерами этапов"""
+    
+    def __init__(
+        self,
+        url: str,
+        title: Optional[str] = None,
+        h1: Optional[str] = None,
+        first_paragraph: Optional[str] = None,
+        screenshot: Optional[bytes] = None,
+        error: Optional[str] = None,
+        method: str = "browser"
+    ):
+        self.url = url
+        self.title = title
+        self.h1 = h1
+        self.first_paragraph = first_paragraph
+        self.screenshot = screenshot
+        self.error = error
+        # Дополнительные поля из parser_extract_fields
+        self.paragraphs: List[str] = []
+        self.meta_description: Optional[str] = None
+        self.og: Dict[str, str] = {}
+        self.prices: List[str] = []
+        # Ссылки страницы [(URL, текст)] - только при обходе сайта
+        self.links: List[Tuple[str, str]] = []
+        # Способ получения: browser (Chrome) или http (без браузера)
+        self.method = method
+        # Длительность этапов в секундах: driver, page_load, ready_wait, extract, screenshot, total
+        # (для http: fetch, extract, total)
+        self.timings: Dict[str, float] = {}
+    
+    def apply_extracted(self, data: Dict[str, Any]):
+        """Заполнить поля из результата извлечения (скрипт или HTML парсер)"""
+        self.title = data.get("title") or None
+        self.h1 = data.get("h1") or None
+        self.paragraphs = data.get("paragraphs") or []
+        self.first_paragraph = self.paragraphs[0][:500] if self.paragraphs else None
+        self.meta_description = data.get("meta_description") or None
+        self.og = data.get("og") or {}
+        self.prices = data.get("prices") or []
+        self.links = [tuple(link) for link in data.get("links") or []]
+    
+    def as_tuple(self) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[bytes], Optional[str]]:
+        """Формат (title, h1, first_paragraph, screenshot, error) для parse_url"""
+        return self.title, self.h1, self.first_paragraph, self.screenshot, self.error
+
+
+class SiteCrawlResult:
+    """Результат обхода сайта: стартовая страница, внутренние страницы и их общий текст"""
+    
+    def __init__(self, landing: PageParseResult, pages: Optional[List[PageParseResult]] = None):
+        self.landing = landing
+        self.pages = pages or []
+        # Текст всех загруженных страниц одним контекстом для анализа
+        self.text = ""
+    
+    @property
+    def urls(self) -> List[str]:
+        """URL успешно загруженных страниц, начиная со стартовой"""
+        return [page.url for page in [self.landing, *self.pages] if not page.error]
+
 
 class ParserService:
     """Парсинг веб-страниц через Chrome с созданием скриншота"""
@@ -31,9 +190,36 @@ class ParserService:
         logger.info("Инициализация Parser сервиса")
         logger.info(f"  Timeout: {settings.parser_timeout} сек")
         logger.info(f"  User-Agent: {settings.parser_user_agent[:50]}...")
+        logger.info(f"  Размер пула драйверов: {settings.parser_pool_size}")
+        logger.info(f"  Пересоздание драйвера каждые {settings.parser_driver_max_uses} страниц")
+        logger.info(f"  Ожидание готовности страницы: до {settings.parser_ready_max_wait} сек")
+        logger.info(f"  Извлекаемые поля: {', '.join(settings.parser_extract_fields)}")
         
         self.timeout = settings.parser_timeout
-        self._executor = ThreadPoolExecutor(max_workers=2)
+        self._executor = ThreadPoolExecutor(max_workers=settings.parser_pool_size)
+        self._pool = DriverPool(
+            factory=self._create_driver,
+            size=settings.parser_pool_size,
+            max_uses=settings.parser_driver_max_uses,
+            acquire_timeout=settings.parser_pool_acquire_timeout
+        )
+        
+        # Ожидание готовности страницы
+        self.ready_max_wait = settings.parser_ready_max_wait
+        self.ready_quiet_period = settings.parser_ready_quiet_period
+        self.ready_poll_interval = settings.parser_ready_poll_interval
+        
+        # Извлекаемые поля страницы
+        self.extract_fields = list(settings.parser_extract_fields)
+        self.max_paragraphs = settings.parser_max_paragraphs
+        self.max_prices = settings.parser_max_prices
+        
+        # Вежливость к сайтам: загрузки одного хоста, паузы, robots.txt
+        self.crawl_scheduler = CrawlScheduler()
+        
+        # Быстрый режим без браузера для запросов без скриншота
+        self._http = HttpFetcher(self.extract_fields, self.max_paragraphs, self.max_prices) if settings.parser_http_fast_path else None
+        logger.info(f"  HTTP режим без браузера: {'включён' if self._http else 'выключен'}")
         
         logger.info("Parser сервис инициализирован ✓")
         logger.info("=" * 50)
@@ -48,156 +234,450 @@ class ParserService:
         options.add_argument('--no-sandbox')
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-gpu')
-        options.add_argument('--window-size=1920,1080')
+        options.add_argument(f'--window-size={DEFAULT_VIEWPORT[0]},{DEFAULT_VIEWPORT[1]}')
         options.add_argument(f'--user-agent={settings.parser_user_agent}')
         options.add_argument('--disable-blink-features=AutomationControlled')
         options.add_experimental_option('excludeSwitches', ['enable-automation'])
         options.add_experimental_option('useAutomationExtension', False)
         
         logger.debug("  Опции Chrome настроены")
-        logger.info("  📥 Загрузка ChromeDriver...")
         
-        # Автоматическая установка ChromeDriver
-        service = Service(ChromeDriverManager().install())
+        # Путь к ChromeDriver определяется один раз на процесс
+        service = Service(chromedriver_resolver.resolve())
         driver = webdriver.Chrome(service=service, options=options)
+        driver.set_page_load_timeout(self.timeout)
         
         elapsed = time.time() - start_time
+        parser_stage_duration.observe(elapsed, stage="driver_create", method="browser")
         logger.info(f"  ✓ Chrome драйвер создан за {elapsed:.2f} сек")
         
         return driver
     
-    def _parse_sync(self, url: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[bytes], Optional[str]]:
+    def _wait_for_ready(self, driver: webdriver.Chrome) -> float:
         """
-        Синхронный парсинг URL (выполняется в отдельном потоке)
+        Дождаться стабилизации страницы: document.readyState == 'complete'
+        и ни DOM мутаций, ни новых сетевых ресурсов в течение quiet_period.
+        Возвращает фактическое время ожидания (не больше ready_max_wait).
         """
-        logger.info("=" * 50)
-        logger.info(f"🔍 ПАРСИНГ САЙТА: {url}")
+        start_time = time.time()
+        last_state = None
+        last_change = start_time
         
-        driver = None
+        while True:
+            now = time.time()
+            try:
+                ready_state, mutations, resources = driver.execute_script(READINESS_SCRIPT)
+            except WebDriverException as e:
+                # Страница может перезагружаться (редирект) - пробуем ещё раз
+                logger.debug(f"  Проверка готовности не удалась: {e}")
+                ready_state, mutations, resources = None, None, None
+            
+            state = (ready_state, mutations, resources)
+            if state != last_state:
+                last_state = state
+                last_change = now
+            elif ready_state == "complete" and now - last_change >= self.ready_quiet_period:
+                break
+            
+            if now - start_time >= self.ready_max_wait:
+                logger.info(f"  ⚠ Страница не стабилизировалась за {self.ready_max_wait} сек")
+                break
+            
+            time.sleep(self.ready_poll_interval)
+        
+        return time.time() - start_time
+    
+    @staticmethod
+    def _describe_error(error: Exception) -> Tuple[str, bool]:
+        """Понятное сообщение об ошибке загрузки и признак сбоя самого браузера"""
+        if isinstance(error, TimeoutException):
+            return "Превышено время ожидания загрузки страницы", False
+        if isinstance(error, WebDriverException):
+            error_msg = str(error)
+            logger.error(f"  Детали: {error_msg[:200]}")
+            # Сетевые ошибки сайта не означают сбой браузера
+            broken = 'net::ERR_' not in error_msg
+            if 'net::ERR_NAME_NOT_RESOLVED' in error_msg:
+                return "Не удалось найти сайт по указанному адресу", broken
+            if 'net::ERR_CONNECTION_REFUSED' in error_msg:
+                return "Соединение отклонено сервером", broken
+            if 'net::ERR_CONNECTION_TIMED_OUT' in error_msg:
+                return "Превышено время ожидания соединения", broken
+            return f"Ошибка браузера: {error_msg[:200]}", broken
+        return f"Ошибка при загрузке страницы: {str(error)[:200]}", False
+    
+    def _load_page(self, driver: webdriver.Chrome, result: PageParseResult, timeout: float,
+                   screenshot: bool, max_links: int) -> bool:
+        """
+        Загрузить страницу в текущей вкладке драйвера и заполнить result.
+        Возвращает True, если сломался сам браузер (драйвер нельзя использовать дальше)
+        """
+        url = result.url
+        timings = result.timings
         total_start = time.time()
         
+        logger.info("=" * 50)
+        logger.info(f"🔍 ПАРСИНГ САЙТА: {url}")
+        
         try:
-            driver = self._create_driver()
-            driver.set_page_load_timeout(self.timeout)
-            
             # Переходим на страницу
             logger.info(f"  📄 Загрузка страницы...")
-            page_start = time.time()
-            driver.get(url)
-            page_elapsed = time.time() - page_start
-            logger.info(f"  ✓ Страница загружена за {page_elapsed:.2f} сек")
+            stage_start = time.time()
+            with tracer.span("parser.page_load"):
+                driver.get(url)
+                
+                # Ждём загрузки body
+                logger.info("  ⏳ Ожидание body элемента...")
+                WebDriverWait(driver, timeout).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+            timings["page_load"] = time.time() - stage_start
+            logger.info(f"  ✓ Страница загружена за {timings['page_load']:.2f} сек")
             
-            # Ждём загрузки body
-            logger.info("  ⏳ Ожидание body элемента...")
-            WebDriverWait(driver, self.timeout).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            logger.info("  ✓ Body элемент найден")
+            # Ждём, пока динамический контент перестанет меняться
+            logger.info("  ⏳ Ожидание стабилизации страницы...")
+            with tracer.span("parser.ready_wait"):
+                timings["ready_wait"] = self._wait_for_ready(driver)
+            logger.info(f"  ✓ Страница готова через {timings['ready_wait']:.2f} сек")
             
-            # Даём странице время на загрузку динамического контента
-            logger.info("  ⏳ Ожидание динамического контента (2 сек)...")
-            time.sleep(2)
+            # Все поля страницы - одним вызовом скрипта вместо запроса на каждый элемент
+            stage_start = time.time()
+            with tracer.span("parser.extract"):
+                result.apply_extracted(driver.execute_script(
+                    EXTRACTION_SCRIPT,
+                    self.extract_fields + ["links"] if max_links else self.extract_fields,
+                    self.max_paragraphs,
+                    self.max_prices,
+                    PRICE_PATTERN,
+                    max_links
+                ) or {})
+            logger.info(f"  📌 Title: {result.title[:60] if result.title else 'N/A'}...")
+            logger.info(f"  📌 H1: {result.h1[:60] if result.h1 else 'N/A'}...")
+            logger.info(f"  📌 Первый абзац: {result.first_paragraph[:60] if result.first_paragraph else 'N/A'}...")
+            logger.debug(f"  Абзацев: {len(result.paragraphs)}, OG тегов: {len(result.og)}, цен: {len(result.prices)}")
             
-            # Извлекаем title
-            title = driver.title
-            logger.info(f"  📌 Title: {title[:60] if title else 'N/A'}...")
-            
-            # Извлекаем h1
-            h1 = None
-            try:
-                h1_element = driver.find_element(By.TAG_NAME, 'h1')
-                h1 = h1_element.text.strip() if h1_element.text else None
-                logger.info(f"  📌 H1: {h1[:60] if h1 else 'N/A'}...")
-            except Exception as e:
-                logger.debug(f"  H1 не найден: {e}")
-            
-            # Извлекаем первый абзац
-            first_paragraph = None
-            try:
-                paragraphs = driver.find_elements(By.TAG_NAME, 'p')
-                logger.debug(f"  Найдено абзацев: {len(paragraphs)}")
-                for i, p in enumerate(paragraphs):
-                    text = p.text.strip() if p.text else ""
-                    if len(text) > 50:
-                        first_paragraph = text[:500]
-                        logger.info(f"  📌 Первый абзац (p[{i}]): {first_paragraph[:60]}...")
-                        break
-            except Exception as e:
-                logger.debug(f"  Абзацы не найдены: {e}")
+            timings["extract"] = time.time() - stage_start
             
             # Делаем скриншот
-            logger.info("  📸 Создание скриншота...")
-            screenshot_start = time.time()
-            screenshot_bytes = driver.get_screenshot_as_png()
-            screenshot_elapsed = time.time() - screenshot_start
-            screenshot_size_kb = len(screenshot_bytes) / 1024
-            logger.info(f"  ✓ Скриншот создан за {screenshot_elapsed:.2f} сек ({screenshot_size_kb:.1f} KB)")
+            if screenshot:
+                logger.info("  📸 Создание скриншота...")
+                stage_start = time.time()
+                with tracer.span("parser.screenshot") as span:
+                    screenshot_bytes = driver.get_screenshot_as_png()
+                    if span:
+                        span.set_attribute("screenshot.bytes", len(screenshot_bytes))
+                timings["screenshot"] = time.time() - stage_start
+                screenshot_size_kb = len(screenshot_bytes) / 1024
+                logger.info(f"  ✓ Скриншот создан за {timings['screenshot']:.2f} сек ({screenshot_size_kb:.1f} KB)")
+                
+                result.screenshot = screenshot_bytes
             
             total_elapsed = time.time() - total_start
             logger.info(f"  ✅ ПАРСИНГ ЗАВЕРШЁН за {total_elapsed:.2f} сек")
             logger.info("=" * 50)
+            broken = False
             
-            return title, h1, first_paragraph, screenshot_bytes, None
-            
-        except TimeoutException:
+        except Exception as e:
             total_elapsed = time.time() - total_start
-            logger.error(f"  ✗ TIMEOUT за {total_elapsed:.2f} сек")
+            logger.error(f"  ✗ {type(e).__name__} за {total_elapsed:.2f} сек")
+            result.error, broken = self._describe_error(e)
             logger.error("=" * 50)
-            return None, None, None, None, "Превышено время ожидания загрузки страницы"
+        
+        timings["total"] = time.time() - total_start
+        return broken
+    
+    def _parse_pages_sync(self, urls: List[str], timeout: Optional[float] = None,
+                          viewport: Optional[Tuple[int, int]] = None, screenshot: bool = True,
+                          max_links: int = 0, delay: float = 0.0,
+                          follow: Optional[Callable[[PageParseResult], List[str]]] = None) -> List[PageParseResult]:
+        """
+        Синхронный парсинг страниц по очереди в одной вкладке одного драйвера
+        из пула (выполняется в отдельном потоке). delay - пауза между страницами.
+        timeout и viewport - настройки сайта из реестра конкурентов,
+        после парсинга драйвер возвращается к настройкам по умолчанию.
+        follow - внутренние страницы по первой странице: загружаются следом
+        в той же вкладке без скриншота и ссылок
+        """
+        results = [PageParseResult(url) for url in urls]
+        pooled = None
+        broken = False
+        customized = False
+        timeout = timeout or self.timeout
+        
+        try:
+            stage_start = time.time()
+            with tracer.span("parser.driver") as span:
+                pooled = self._pool.acquire()
+                driver = pooled.driver
+                if span:
+                    span.set_attribute("driver.uses", pooled.uses)
+            results[0].timings["driver"] = time.time() - stage_start
+            logger.info(f"  🚗 Драйвер из пула (страница #{pooled.uses})")
             
-        except WebDriverException as e:
-            total_elapsed = time.time() - total_start
-            error_msg = str(e)
-            logger.error(f"  ✗ WebDriver ошибка за {total_elapsed:.2f} сек")
-            logger.error(f"  Детали: {error_msg[:200]}")
-            logger.error("=" * 50)
+            # Настройки сайта: свой таймаут загрузки и размер окна
+            if timeout != self.timeout or (viewport and tuple(viewport) != DEFAULT_VIEWPORT):
+                customized = True
+                driver.set_page_load_timeout(timeout)
+                driver.set_window_size(*(viewport or DEFAULT_VIEWPORT))
+                logger.info(f"  ⚙️ Таймаут {timeout} сек, окно {'x'.join(map(str, viewport or DEFAULT_VIEWPORT))}")
+            
+            # Страницы из follow добавляются в results и загружаются в этом же цикле
+            for i, result in enumerate(results):
+                if broken:
+                    result.error = "Браузер недоступен"
+                    continue
+                if i and delay:
+                    time.sleep(delay)
+                followed = follow is not None and i > 0
+                broken = self._load_page(driver, result, timeout, screenshot and not followed,
+                                         0 if followed else max_links)
+                # Origin страниц (и после редиректов) - для очистки storage при возврате в пул
+                pooled.visit(result.url)
+                if not broken:
+                    try:
+                        pooled.visit(driver.current_url)
+                    except WebDriverException:
+                        pass
+                if follow is not None and i == 0 and not result.error:
+                    results.extend(PageParseResult(link) for link in follow(result))
             
-            if 'net::ERR_NAME_NOT_RESOLVED' in error_msg:
-                return None, None, None, None, "Не удалось найти сайт по указанному адресу"
-            elif 'net::ERR_CONNECTION_REFUSED' in error_msg:
-                return None, None, None, None, "Соединение отклонено сервером"
-            elif 'net::ERR_CONNECTION_TIMED_OUT' in error_msg:
-                return None, None, None, None, "Превышено время ожидания соединения"
-            else:
-                return None, None, None, None, f"Ошибка браузера: {error_msg[:200]}"
-                
         except Exception as e:
-            total_elapsed = time.time() - total_start
-            logger.error(f"  ✗ Неизвестная ошибка за {total_elapsed:.2f} сек: {e}")
-            logger.error("=" * 50)
-            return None, None, None, None, f"Ошибка при загрузке страницы: {str(e)[:200]}"
+            logger.error(f"  ✗ Не удалось подготовить драйвер: {e}")
+            error, broken = self._describe_error(e)
+            for result in results:
+                result.error = error
             
         finally:
-            if driver:
-                try:
-                    logger.debug("  Закрытие драйвера...")
-                    driver.quit()
-                    logger.debug("  ✓ Драйвер закрыт")
-                except Exception as e:
-                    logger.warning(f"  Ошибка при закрытии драйвера: {e}")
+            if pooled:
+                if customized and not broken:
+                    try:
+                        pooled.driver.set_page_load_timeout(self.timeout)
+                        pooled.driver.set_window_size(*DEFAULT_VIEWPORT)
+                    except WebDriverException as e:
+                        logger.warning(f"  ⚠ Не удалось вернуть настройки драйвера: {e}")
+                        broken = True
+                logger.debug("  Возврат драйвера в пул...")
+                self._pool.release(pooled, broken=broken)
+        
+        # Время ожидания драйвера входит в общее время первой страницы
+        results[0].timings["total"] = results[0].timings.get("total", 0.0) + results[0].timings.get("driver", 0.0)
+        return results
     
-    async def parse_url(self, url: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[bytes], Optional[str]]:
+    def _parse_sync(self, url: str, timeout: Optional[float] = None,
+                    viewport: Optional[Tuple[int, int]] = None, max_links: int = 0,
+                    screenshot: bool = True) -> PageParseResult:
         """
-        Асинхронный парсинг URL через Chrome
+        Синхронный парсинг URL (выполняется в отдельном потоке);
+        screenshot=False - только текст, без скриншота
         """
+        return self._parse_pages_sync([url], timeout, viewport, screenshot=screenshot, max_links=max_links)[0]
+    
+    async def warmup(self):
+        """Определить путь к ChromeDriver заранее, до первого запроса"""
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(self._executor, functools.partial(chromedriver_resolver.resolve, install=True))
+        except Exception as e:
+            logger.warning(f"  ⚠ ChromeDriver недоступен, парсинг работать не будет: {e}")
+    
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """Добавить протокол, если его нет"""
+        if not url.startswith(('http://', 'https://')):
+            return 'https://' + url
+        return url
+    
+    async def _fetch_http(self, url: str, timeout: Optional[float] = None,
+                          max_links: int = 0) -> Optional[PageParseResult]:
+        """Текст страницы по HTTP без браузера (None - нужен Chrome)"""
+        result = PageParseResult(url, method="http")
+        start_time = time.time()
+        data = await self._http.fetch(url, result.timings, timeout, max_links)
+        if data is None:
+            return None
+        
+        result.apply_extracted(data)
+        result.timings["total"] = time.time() - start_time
+        logger.info(f"  ⚡ {url} получен по HTTP за {result.timings['total'] * 1000:.0f} мс")
+        return result
+    
+    async def parse_page(self, url: str, screenshot: bool = True, timeout: Optional[float] = None,
+                         viewport: Optional[Tuple[int, int]] = None, links: bool = False) -> PageParseResult:
+        """
+        Асинхронный парсинг URL с замерами этапов.
+        Без скриншота страница сначала загружается по HTTP, Chrome
+        используется, только если текст рендерится скриптами.
+        timeout и viewport переопределяют таймаут загрузки и размер окна,
+        links - собрать ссылки страницы (для обхода сайта).
+        """
+        max_links = settings.parser_crawl_max_links if links else 0
         # Добавляем протокол если его нет
         original_url = url
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
+        url = self.normalize_url(url)
+        if url != original_url:
             logger.info(f"  URL дополнен протоколом: {original_url} -> {url}")
         
         logger.info(f"🚀 Запуск асинхронного парсинга: {url}")
         
-        # Запускаем синхронный парсинг в отдельном потоке
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            self._executor,
-            self._parse_sync,
-            url
-        )
+        with tracer.span("parser.parse_page", **{"url": url, "screenshot": screenshot}) as span:
+            async with self.crawl_scheduler.slot(url):
+                result = None
+                if not screenshot and self._http is not None:
+                    with tracer.span("parser.http_fetch"):
+                        result = await self._fetch_http(url, timeout, max_links)
+                
+                if result is None:
+                    # Запускаем синхронный парсинг в отдельном потоке;
+                    # контекст (спан, id запроса) передаём в поток явно
+                    loop = asyncio.get_event_loop()
+                    context = contextvars.copy_context()
+                    result = await loop.run_in_executor(
+                        self._executor,
+                        context.run,
+                        functools.partial(self._parse_sync, url, timeout, viewport, max_links, screenshot)
+                    )
+            if span:
+                span.set_attribute("parser.method", result.method)
+                if result.error:
+                    span.status = "ERROR"
+                    span.status_message = result.error
         
+        self._observe(result)
         return result
     
+    @staticmethod
+    def _observe(result: PageParseResult):
+        for stage, elapsed in result.timings.items():
+            parser_stage_duration.observe(elapsed, stage=stage, method=result.method)
+    
+    async def crawl_site(self, url: str, max_pages: Optional[int] = None, screenshot: bool = True,
+                         timeout: Optional[float] = None,
+                         viewport: Optional[Tuple[int, int]] = None) -> SiteCrawlResult:
+        """
+        Обход сайта в пределах max_pages страниц (включая стартовую).
+        
+        Со стартовой страницы берутся внутренние ссылки, сначала вероятно
+        полезные (цены, бронирование, домики, SPA), запрещённые robots.txt
+        пропускаются. Если стартовая страница загружена браузером, внутренние
+        страницы загружаются следом в той же вкладке того же драйвера - одна
+        аренда драйвера на весь обход. Если стартовая получена по HTTP,
+        внутренние загружаются по HTTP с учётом лимитов хоста (по умолчанию
+        по одной, с паузой PARSER_HOST_MIN_DELAY), а требующие браузера - по
+        очереди в одной вкладке одного драйвера из пула.
+        Текст всех страниц собирается в SiteCrawlResult.text.
+        """
+        url = self.normalize_url(url)
+        budget = crawl_budget(max_pages, settings.parser_crawl_max_pages, settings.parser_crawl_max_pages_limit)
+        
+        with tracer.span("parser.crawl_site", **{"url": url, "crawl.budget": budget}) as span:
+            if budget <= 1:
+                crawl = SiteCrawlResult(await self.parse_page(url, screenshot=screenshot, timeout=timeout,
+                                                              viewport=viewport))
+            else:
+                crawl = await self._crawl_landing(url, budget, screenshot, timeout, viewport)
+            
+            crawl.text = aggregate_text([crawl.landing, *crawl.pages], settings.parser_crawl_max_text_chars)
+            if span:
+                span.set_attribute("crawl.pages", len(crawl.urls))
+        
+        logger.info(f"✅ Обход {url} завершён: страниц {len(crawl.urls)}, текста {len(crawl.text)} символов")
+        return crawl
+    
+    async def _select_crawl_links(self, url: str, budget: int, landing: PageParseResult) -> List[str]:
+        """Внутренние страницы для обхода, разрешённые robots.txt (не больше budget - 1)"""
+        candidates: List[str] = []
+        for link in select_links(url, landing.links, len(landing.links)):
+            if await self.crawl_scheduler.allowed(link):
+                candidates.append(link)
+                if len(candidates) >= budget - 1:
+                    break
+        logger.info(f"🕸️ Обход {url}: ссылок {len(landing.links)}, выбрано страниц {len(candidates)}")
+        return candidates
+    
+    async def _crawl_landing(self, url: str, budget: int, screenshot: bool, timeout: Optional[float],
+                             viewport: Optional[Tuple[int, int]]) -> SiteCrawlResult:
+        """Стартовая страница и внутренние страницы обхода"""
+        max_links = settings.parser_crawl_max_links
+        
+        if not screenshot and self._http is not None:
+            async with self.crawl_scheduler.slot(url):
+                with tracer.span("parser.http_fetch", url=url):
+                    landing = await self._fetch_http(url, timeout, max_links)
+            if landing is not None:
+                self._observe(landing)
+                crawl = SiteCrawlResult(landing)
+                candidates = await self._select_crawl_links(url, budget, landing)
+                if candidates:
+                    crawl.pages = await self._crawl_pages(url, candidates, timeout, viewport)
+                return crawl
+        
+        # Стартовая и внутренние страницы - в одной вкладке одного драйвера;
+        # ссылки выбираются в потоке браузера через цикл событий (robots.txt)
+        loop = asyncio.get_event_loop()
+        
+        def follow(landing: PageParseResult) -> List[str]:
+            return asyncio.run_coroutine_threadsafe(
+                self._select_crawl_links(url, budget, landing), loop
+            ).result()
+        
+        delay = await self.crawl_scheduler.delay_for(url)
+        async with self.crawl_scheduler.slot(url):
+            context = contextvars.copy_context()
+            loaded = await loop.run_in_executor(
+                self._executor,
+                context.run,
+                functools.partial(self._parse_pages_sync, [url], timeout, viewport, screenshot,
+                                  max_links, delay, follow)
+            )
+        
+        for page in loaded:
+            self._observe(page)
+        for page in loaded[1:]:
+            if page.error:
+                logger.warning(f"   ✗ {page.url}: {page.error}")
+        return SiteCrawlResult(loaded[0], loaded[1:])
+    
+    async def _crawl_pages(self, site_url: str, urls: List[str], timeout: Optional[float],
+                           viewport: Optional[Tuple[int, int]]) -> List[PageParseResult]:
+        """Внутренние страницы сайта без скриншотов (порядок как в urls)"""
+        
+        async def fetch(url: str) -> Optional[PageParseResult]:
+            async with self.crawl_scheduler.slot(url):
+                with tracer.span("parser.http_fetch", url=url):
+                    return await self._fetch_http(url, timeout)
+        
+        pages: List[Optional[PageParseResult]] = [None] * len(urls)
+        if self._http is not None:
+            pages = list(await asyncio.gather(*(fetch(url) for url in urls)))
+        
+        browser_urls = [url for url, page in zip(urls, pages) if page is None]
+        if browser_urls:
+            # Одна вкладка на все страницы: паузу хоста выдерживает сам поток
+            delay = await self.crawl_scheduler.delay_for(site_url)
+            async with self.crawl_scheduler.slot(site_url):
+                loop = asyncio.get_event_loop()
+                context = contextvars.copy_context()
+                loaded = await loop.run_in_executor(
+                    self._executor,
+                    context.run,
+                    functools.partial(self._parse_pages_sync, browser_urls, timeout, viewport, False, 0, delay)
+                )
+            by_url = dict(zip(browser_urls, loaded))
+            pages = [page or by_url[url] for url, page in zip(urls, pages)]
+        
+        for page in pages:
+            self._observe(page)
+            if page.error:
+                logger.warning(f"   ✗ {page.url}: {page.error}")
+        return pages
+    
+    async def parse_url(self, url: str, screenshot: bool = True) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[bytes], Optional[str]]:
+        """
+        Асинхронный парсинг URL (Chrome или HTTP, если скриншот не нужен)
+        """
+        result = await self.parse_page(url, screenshot=screenshot)
+        return result.as_tuple()
+    
     def screenshot_to_base64(self, screenshot_bytes: bytes) -> str:
         """Конвертировать скриншот в base64"""
         base64_str = base64.b64encode(screenshot_bytes).decode('utf-8')
@@ -206,36 +686,42 @@ class ParserService:
     
     async def parse_competitors(self) -> List[Tuple[str, Optional[str], Optional[str], Optional[str], Optional[bytes], Optional[str]]]:
         """
-        Автоматический сбор данных со всех сайтов конкурентов
+        Автоматический сбор данных со всех включённых сайтов реестра конкурентов
+        (в порядке приоритета, с таймаутом и размером окна каждого сайта)
         """
+        sites = interleave_by_host(competitor_service.sites(), lambda site: site.url)
+        
         logger.info("=" * 60)
         logger.info("🚀 АВТОМАТИЧЕСКИЙ СБОР ДАННЫХ КОНКУРЕНТОВ")
-        logger.info(f"   Количество сайтов: {len(settings.competitor_urls)}")
+        logger.info(f"   Количество сайтов: {len(sites)}")
         logger.info("=" * 60)
         
-        results = []
-        
-        for i, url in enumerate(settings.competitor_urls, 1):
-            logger.info(f"📍 Парсинг сайта {i}/{len(settings.competitor_urls)}: {url}")
-            
+        async def parse_one(i: int, site):
+            request_priority.set(PRIORITY_BACKGROUND)
+            url = site.url
+            logger.info(f"📍 Парсинг сайта {i}/{len(sites)}: {url}")
             try:
-                # Парсим сайт
-                title, h1, first_paragraph, screenshot_bytes, error = await self.parse_url(url)
+                page = await self.parse_page(url, timeout=site.timeout, viewport=site.viewport)
+                title, h1, first_paragraph, screenshot_bytes, error = page.as_tuple()
                 
                 if error:
                     logger.warning(f"   ✗ Ошибка парсинга {url}: {error}")
-                    results.append((url, None, None, None, None, error))
-                else:
-                    logger.info(f"   ✓ Успешно спарсен: {title[:50] if title else 'N/A'}")
-                    results.append((url, title, h1, first_paragraph, screenshot_bytes, None))
+                    return (url, None, None, None, None, error)
+                
+                competitor_service.mark_crawled(url)
+                logger.info(f"   ✓ Успешно спарсен: {title[:50] if title else 'N/A'}")
+                return (url, title, h1, first_paragraph, screenshot_bytes, None)
                 
             except Exception as e:
                 logger.error(f"   ✗ Критическая ошибка при парсинге {url}: {e}")
-                results.append((url, None, None, None, None, str(e)))
-            
-            # Небольшая пауза между запросами
-            if i < len(settings.competitor_urls):
-                await asyncio.sleep(1)
+                return (url, None, None, None, None, str(e))
+        
+        # Сайты парсятся параллельно: общий лимит задаёт пул драйверов,
+        # а загрузки одного хоста - планировщик обхода (слоты и паузы хоста).
+        # Задачи создаются по приоритету, поэтому важные сайты получают драйвер раньше
+        results = list(await asyncio.gather(
+            *(parse_one(i, site) for i, site in enumerate(sites, 1))
+        ))
         
         logger.info("=" * 60)
         logger.info(f"✅ СБОР ДАННЫХ ЗАВЕРШЁН: {len(results)} сайтов обработано")
@@ -243,10 +729,18 @@ class ParserService:
         
         return results
     
+    def pool_stats(self) -> Dict[str, int]:
+        """Состояние пула драйверов"""
+        return {"size": self._pool.size, "created": self._pool.created, "idle": self._pool.idle}
+    
     async def close(self):
-        """Закрыть executor"""
+        """Закрыть executor и пул драйверов"""
         logger.info("Закрытие Parser сервиса...")
         self._executor.shutdown(wait=False)
+        self._pool.close()
+        if self._http is not None:
+            await self._http.close()
+        await self.crawl_scheduler.close()
         logger.info("Parser сервис закрыт ✓")
 
 
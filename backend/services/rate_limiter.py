@@ -0,0 +1,185 @@
+"""
+Ограничитель вызовов модели: параллелизм, запросы и токены в минуту,
+с приоритетом интерактивных запросов над фоновыми
+"""
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Union
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.rate_limiter")
+
+# Приоритеты (меньше - раньше)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Приоритет текущей задачи: фоновые пути (сбор конкурентов, пакеты, очередь задач)
+# выставляют PRIORITY_BACKGROUND, всё остальное считается интерактивным
+request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+
+class TokenBucket:
+    """Корзина токенов: ёмкость capacity, пополнение capacity в минуту"""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Через сколько секунд в корзине будет amount (0 - уже есть)"""
+        self._refill()
+        # Запрос больше ёмкости пропускается при полной корзине
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        """Вернуть (или доплатить при amount < 0) разницу с фактическим расходом"""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Reservation:
+    """Разрешение на один вызов модели"""
+
+    def __init__(self, limiter: "RateLimiter", tokens: int):
+        self._limiter = limiter
+        self.tokens = tokens
+        self._released = False
+
+    def settle(self, used_tokens: Optional[int]):
+        """Учесть фактический расход токенов из usage ответа"""
+        if used_tokens is not None:
+            self._limiter._settle(self.tokens - used_tokens)
+            self.tokens = used_tokens
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+
+class RateLimiter:
+    """
+    Общий ограничитель вызовов модели.
+
+    Вызов ждёт, пока одновременно выполняется меньше max_concurrency вызовов
+    и в корзинах RPM/TPM хватает запаса. Ожидающие обслуживаются по приоритету,
+    затем по очереди: интерактивный запрос обгоняет накопившиеся фоновые.
+    Токены резервируются по оценке и уточняются по usage ответа.
+    """
+
+    def __init__(self, max_concurrency: int, rpm: int = 0, tpm: int = 0):
+        self.max_concurrency = max(1, max_concurrency)
+        self._rpm = TokenBucket(rpm) if rpm > 0 else None
+        self._tpm = TokenBucket(tpm) if tpm > 0 else None
+
+        self._active = 0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._changed = asyncio.Event()
+
+        # Метрики по приоритетам
+        self.acquired: Dict[int, int] = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_seconds: Dict[int, float] = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.tokens_used = 0
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _wait_time(self, tokens: int) -> Optional[float]:
+        """0 - можно выполнять, None - ждать освобождения слота, иначе секунды до пополнения"""
+        if self._active >= self.max_concurrency:
+            return None
+        wait = 0.0
+        if self._rpm is not None:
+            wait = max(wait, self._rpm.wait_time(1))
+        if self._tpm is not None:
+            wait = max(wait, self._tpm.wait_time(tokens))
+        return wait
+
+    async def acquire(self, tokens: int, priority: Optional[int] = None) -> Reservation:
+        """Дождаться разрешения на вызов с оценкой расхода tokens"""
+        if priority is None:
+            priority = request_priority.get()
+        start_time = time.monotonic()
+        entry = [priority, next(self._sequence)]
+        heapq.heappush(self._waiters, entry)
+
+        try:
+            while True:
+                delay: Optional[float] = None
+                if self._waiters[0] is entry:
+                    delay = self._wait_time(tokens)
+                    if delay == 0:
+                        break
+
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            self._notify()
+            raise
+
+        heapq.heappop(self._waiters)
+        self._active += 1
+        self.tokens_used += tokens
+        if self._rpm is not None:
+            self._rpm.take(1)
+        if self._tpm is not None:
+            self._tpm.take(tokens)
+
+        waited = time.monotonic() - start_time
+        self.acquired[priority] = self.acquired.get(priority, 0) + 1
+        self.wait_seconds[priority] = self.wait_seconds.get(priority, 0.0) + waited
+        if waited > 1:
+            logger.info(f"  ⏳ Лимит модели: ожидание {waited:.2f} сек ({PRIORITY_NAMES.get(priority, priority)})")
+
+        # Следующий в очереди проверяет лимиты сам
+        self._notify()
+        return Reservation(self, tokens)
+
+    def _settle(self, unused_tokens: int):
+        self.tokens_used -= unused_tokens
+        if self._tpm is not None:
+            self._tpm.give_back(unused_tokens)
+            if unused_tokens > 0:
+                self._notify()
+
+    def _release(self):
+        self._active -= 1
+        self._notify()
+
+    def stats(self) -> Dict[str, Union[int, float, Dict[str, Union[int, float]]]]:
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "rpm_limit": int(self._rpm.capacity) if self._rpm else 0,
+            "tpm_limit": int(self._tpm.capacity) if self._tpm else 0,
+            "tokens_used": self.tokens_used,
+            "acquired": {PRIORITY_NAMES[p]: count for p, count in self.acquired.items()},
+            "wait_seconds": {PRIORITY_NAMES[p]: round(total, 3) for p, total in self.wait_seconds.items()}
+        }
@@ -0,0 +1,315 @@
+"""
+Встроенный планировщик периодического сбора данных конкурентов
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.config import settings
+from backend.models.schemas import SchedulerRun, ScheduleGroupInfo
+from backend.services.collector_service import collector_service
+from backend.services.tracing import tracer
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.scheduler")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduler_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL,
+    trigger TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    duration REAL,
+    sites INTEGER NOT NULL DEFAULT 0,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    site_timings_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scheduler_runs_group ON scheduler_runs(group_name, id);
+"""
+
+# Статусы запусков
+RUN_RUNNING = "running"
+RUN_SUCCEEDED = "succeeded"
+RUN_FAILED = "failed"
+RUN_SKIPPED = "skipped"
+RUN_CANCELLED = "cancelled"
+RUN_INTERRUPTED = "interrupted"
+
+# Источник запуска
+TRIGGER_SCHEDULE = "schedule"
+TRIGGER_MANUAL = "manual"
+
+
+@dataclass
+class ScheduleGroup:
+    """Группа URL со своим интервалом сбора"""
+    name: str
+    urls: List[str]
+    interval: float
+    jitter: float
+    next_run_at: Optional[datetime] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class SchedulerService:
+    """
+    Периодический сбор данных конкурентов без внешнего cron.
+
+    Каждая группа URL запускается раз в interval секунд со случайным
+    разбросом ±jitter (доля интервала), чтобы группы не стартовали
+    одновременно. Если предыдущий запуск группы ещё идёт, очередной
+    пропускается. Сайты с crawl_interval в реестре конкурентов собираются
+    не чаще своего интервала. Каждый запуск записывается в таблицу scheduler_runs
+    (статус, длительность, итоги и время обработки каждого сайта);
+    после перезапуска сервера отсчёт продолжается от последнего запуска.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Scheduler сервиса")
+
+        self.enabled = settings.scheduler_enabled
+        self.max_runs = max(1, settings.scheduler_max_runs)
+        self.db_path = Path(settings.history_db)
+        self.groups: Dict[str, ScheduleGroup] = self._load_groups()
+        self._timers: List[asyncio.Task] = []
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            # Запуски, оборванные остановкой процесса
+            self._conn.execute(
+                "UPDATE scheduler_runs SET status = ? WHERE status = ?", (RUN_INTERRUPTED, RUN_RUNNING)
+            )
+
+        logger.info(f"  Планировщик: {'включён' if self.enabled else 'выключен'}")
+        for group in self.groups.values():
+            logger.info(
+                f"  Группа {group.name}: {len(group.urls) or 'все'} сайтов, "
+                f"каждые {group.interval:.0f} сек ±{group.jitter:.0%}"
+            )
+        logger.info("Scheduler сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    @staticmethod
+    def _load_groups() -> Dict[str, ScheduleGroup]:
+        """Группы из scheduler_groups; без них - одна группа default со всеми конкурентами"""
+        configured = settings.scheduler_groups or [{"name": "default"}]
+        groups = {}
+        for item in configured:
+            name = str(item.get("name") or f"group{len(groups) + 1}")
+            groups[name] = ScheduleGroup(
+                name=name,
+                urls=list(item.get("urls") or []),
+                interval=max(1.0, float(item.get("interval") or settings.scheduler_interval)),
+                jitter=min(1.0, max(0.0, float(item.get("jitter", settings.scheduler_jitter))))
+            )
+        return groups
+
+    def start(self):
+        """Запустить таймеры групп (повторный вызов ничего не делает)"""
+        if not self.enabled or self._timers:
+            return
+        self._timers = [asyncio.ensure_future(self._timer(group)) for group in self.groups.values()]
+        logger.info(f"🟢 Планировщик запущен, групп: {len(self._timers)}")
+
+    async def stop(self):
+        """Остановить таймеры и прервать идущие запуски"""
+        tasks = list(self._timers)
+        for group in self.groups.values():
+            group.next_run_at = None
+            if group.running:
+                tasks.append(group.task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._timers = []
+        logger.info("Планировщик остановлен ✓")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _first_delay(self, group: ScheduleGroup) -> float:
+        """Пауза до первого запуска: от начала прошлого запуска группы плюс разброс"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT started_at FROM scheduler_runs WHERE group_name = ? AND status != ? "
+                "ORDER BY id DESC LIMIT 1",
+                (group.name, RUN_SKIPPED)
+            ).fetchone()
+        delay = 0.0
+        if row is not None:
+            elapsed = (datetime.now() - datetime.fromisoformat(row["started_at"])).total_seconds()
+            delay = max(0.0, group.interval - elapsed)
+        return delay + random.uniform(0, group.interval * group.jitter)
+
+    @staticmethod
+    def _next_delay(group: ScheduleGroup) -> float:
+        return group.interval * (1 + random.uniform(-group.jitter, group.jitter))
+
+    async def _timer(self, group: ScheduleGroup):
+        """Таймер группы: запуски идут отдельными задачами, отсчёт не ждёт их завершения"""
+        delay = self._first_delay(group)
+        while True:
+            group.next_run_at = datetime.now() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            try:
+                self.trigger(group.name, TRIGGER_SCHEDULE)
+            except Exception as e:
+                logger.error(f"❌ Планировщик, группа {group.name}: {e}")
+            delay = self._next_delay(group)
+
+    def trigger(self, group_name: str, trigger: str = TRIGGER_MANUAL) -> Optional[SchedulerRun]:
+        """
+        Запустить сбор группы. Возвращает запись запуска; если предыдущий
+        запуск ещё идёт, плановый запуск записывается пропущенным,
+        а ручной не выполняется (None)
+        """
+        group = self.groups[group_name]
+        now = datetime.now()
+
+        if group.running:
+            logger.warning(f"⏭️ Группа {group.name}: предыдущий запуск ещё идёт, пропуск")
+            if trigger != TRIGGER_SCHEDULE:
+                return None
+            run_id = self._insert_run(group.name, trigger, RUN_SKIPPED, now, finished_at=now)
+            return self.get_run(run_id)
+
+        run_id = self._insert_run(group.name, trigger, RUN_RUNNING, now)
+        group.task = asyncio.ensure_future(self._run(group, run_id))
+        logger.info(f"⏰ Группа {group.name}: запуск #{run_id} ({trigger})")
+        return self.get_run(run_id)
+
+    async def _run(self, group: ScheduleGroup, run_id: int):
+        """Собрать данные группы и записать итоги запуска"""
+        started_at = datetime.now()
+        with tracer.span("scheduler.run", **{"scheduler.group": group.name, "scheduler.run_id": run_id}):
+            try:
+                results = await collector_service.collect(urls=group.urls or None, due_only=True)
+            except asyncio.CancelledError:
+                self._finish_run(run_id, started_at, RUN_CANCELLED)
+                raise
+            except Exception as e:
+                logger.error(f"❌ Группа {group.name}, запуск #{run_id}: {e}")
+                self._finish_run(run_id, started_at, RUN_FAILED, error=str(e))
+                return
+
+        errors = sum(1 for item in results if item.error)
+        self._finish_run(
+            run_id, started_at, RUN_SUCCEEDED,
+            sites=len(results),
+            succeeded=len(results) - errors,
+            unchanged=sum(1 for item in results if item.unchanged),
+            errors=errors,
+            site_timings={item.url: round((item.timings or {}).get("total", 0.0), 3) for item in results}
+        )
+
+    def _insert_run(self, group_name: str, trigger: str, status: str, started_at: datetime,
+                    finished_at: Optional[datetime] = None) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO scheduler_runs (group_name, trigger, status, started_at, finished_at, duration) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (group_name, trigger, status, started_at.isoformat(),
+                 finished_at.isoformat() if finished_at else None, 0.0 if finished_at else None)
+            )
+            # Старые записи сверх scheduler_max_runs удаляем
+            self._conn.execute(
+                "DELETE FROM scheduler_runs WHERE id <= ?", (cursor.lastrowid - self.max_runs,)
+            )
+            return cursor.lastrowid
+
+    def _finish_run(self, run_id: int, started_at: datetime, status: str, sites: int = 0,
+                    succeeded: int = 0, unchanged: int = 0, errors: int = 0,
+                    error: Optional[str] = None, site_timings: Optional[Dict[str, float]] = None):
+        finished_at = datetime.now()
+        duration = (finished_at - started_at).total_seconds()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE scheduler_runs
+                SET status = ?, finished_at = ?, duration = ?, sites = ?, succeeded = ?,
+                    unchanged = ?, errors = ?, error = ?, site_timings_json = ?
+                WHERE id = ?
+                """,
+                (status, finished_at.isoformat(), round(duration, 3), sites, succeeded, unchanged,
+                 errors, error, json.dumps(site_timings or {}), run_id)
+            )
+        logger.info(f"🏁 Запуск #{run_id}: {status} за {duration:.2f} сек, сайтов: {sites}, ошибок: {errors}")
+
+    @staticmethod
+    def _to_run(row: sqlite3.Row) -> SchedulerRun:
+        return SchedulerRun(
+            id=row["id"],
+            group=row["group_name"],
+            trigger=row["trigger"],
+            status=row["status"],
+            started_at=datetime.fromisoformat(row["started_at"]),
+            finished_at=datetime.fromisoformat(row["finished_at"]) if row["finished_at"] else None,
+            duration=row["duration"],
+            sites=row["sites"],
+            succeeded=row["succeeded"],
+            unchanged=row["unchanged"],
+            errors=row["errors"],
+            error=row["error"],
+            site_timings=json.loads(row["site_timings_json"]) if row["site_timings_json"] else {}
+        )
+
+    def get_run(self, run_id: int) -> Optional[SchedulerRun]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM scheduler_runs WHERE id = ?", (run_id,)).fetchone()
+        return self._to_run(row) if row else None
+
+    def list_runs(self, group_name: Optional[str] = None, limit: int = 50) -> List[SchedulerRun]:
+        """Запуски от новых к старым"""
+        query = "SELECT * FROM scheduler_runs"
+        params: list = []
+        if group_name:
+            query += " WHERE group_name = ?"
+            params.append(group_name)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._to_run(row) for row in rows]
+
+    def group_info(self) -> List[ScheduleGroupInfo]:
+        """Группы с ближайшим и последним запуском"""
+        items = []
+        for group in self.groups.values():
+            last_runs = self.list_runs(group.name, limit=1)
+            items.append(ScheduleGroupInfo(
+                name=group.name,
+                urls=group.urls,
+                interval=group.interval,
+                jitter=group.jitter,
+                running=group.running,
+                next_run_at=group.next_run_at,
+                last_run=last_runs[0] if last_runs else None
+            ))
+        return items
+
+
+# Глобальный экземпляр
+logger.info("Создание глобального экземпляра Scheduler сервиса...")
+scheduler_service = SchedulerService()
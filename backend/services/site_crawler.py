@@ -0,0 +1,132 @@
+"""
+Выбор внутренних страниц сайта для обхода и сборка их текста в один контекст
+"""
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urldefrag, urlparse
+
+# Начало и конец слова: соседний символ - не буква и не цифра
+# (дефис, подчёркивание, слэш и пробел разделяют слова)
+WORD_START = r"(?<![^\W_])"
+WORD_END = r"(?![^\W_])"
+
+
+def _keywords(*patterns: str) -> re.Pattern:
+    """Шаблон поиска любого из слов с начала слова текста"""
+    return re.compile(WORD_START + "(?:" + "|".join(patterns) + ")", re.IGNORECASE)
+
+
+# Признаки страниц, где видны отличия глэмпинга: цены, бронирование,
+# размещение, SPA и услуги. Вес прибавляется за совпадение в пути или тексте ссылки.
+# Слова сравниваются с началом слова, а не с любой подстрокой: «цен» не находит
+# «лицензию», «book» - «facebook»; короткие английские слова - только целиком
+RELEVANT_KEYWORDS: Tuple[Tuple[int, re.Pattern], ...] = (
+    (5, _keywords("цен", "price", "прайс", "стоимост", "тариф", "rates" + WORD_END)),
+    (4, _keywords("брон", "book", "reserv")),
+    (4, _keywords("домик", "дома", "house", "номер", "room", "размещ", "accommodation", "проживан",
+                  "коттедж", "cottage", "шатер", "шатёр", "villa", "вилл")),
+    (3, _keywords("spa" + WORD_END, "спа" + WORD_END, "бан[яиюь]", "банн(?!ер)", "саун", "wellness",
+                  "чан" + WORD_END, "чаны", "чанах")),
+    (2, _keywords("услуг", "service", "развлеч", "активност", "activit", "меню", "menu", "ресторан", "restaurant")),
+    (1, _keywords("акци", "offer", "спецпредлож", "о нас", "about")),
+)
+
+# Страницы, которые почти не влияют на конкурентный анализ
+IRRELEVANT_KEYWORDS = _keywords(
+    "blog", "news", "новост", "статьи", "article", "privacy", "policy", "политик", "cookie",
+    "login", "signin", "account", "кабинет", "cart" + WORD_END, "корзин", "vacanc", "ваканс", "sitemap",
+    "tel:", "mailto:", "whatsapp", "telegram", r"vk\.com",
+)
+
+# Файлы, а не страницы
+SKIP_EXTENSIONS = re.compile(
+    r"\.(?:pdf|jpe?g|png|gif|webp|svg|ico|zip|rar|docx?|xlsx?|pptx?|mp4|mp3|avi|mov)$",
+    re.IGNORECASE
+)
+
+
+def _site(host: str) -> str:
+    """Хост без www. - поддомен www считается тем же сайтом"""
+    host = host.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def score_link(url: str, text: str) -> int:
+    """Оценка полезности страницы для анализа (меньше 0 - не обходить)"""
+    parsed = urlparse(url)
+    haystack = f"{unquote(parsed.path)} {unquote(parsed.query)} {text}"
+    if IRRELEVANT_KEYWORDS.search(haystack):
+        return -1
+    return sum(weight for weight, keywords in RELEVANT_KEYWORDS if keywords.search(haystack))
+
+
+def select_links(start_url: str, links: Iterable[Sequence[str]], limit: int) -> List[str]:
+    """
+    Внутренние ссылки для обхода: тот же сайт, без якорей, файлов и дублей,
+    сначала вероятно полезные (цены, бронирование, размещение, SPA, услуги),
+    при равной оценке - менее глубокие. Не больше limit ссылок.
+    """
+    if limit <= 0:
+        return []
+
+    start = urlparse(start_url)
+    start_key = (_site(start.netloc), start.path.rstrip("/"))
+    candidates = {}
+    for position, link in enumerate(links):
+        href, text = (list(link) + ["", ""])[:2]
+        href, _ = urldefrag(href or "")
+        parsed = urlparse(href)
+        if parsed.scheme not in ("http", "https") or _site(parsed.netloc) != start_key[0]:
+            continue
+        if (_site(parsed.netloc), parsed.path.rstrip("/")) == start_key and not parsed.query:
+            continue
+        if SKIP_EXTENSIONS.search(parsed.path):
+            continue
+
+        score = score_link(href, text or "")
+        if score < 0:
+            continue
+        depth = len([part for part in parsed.path.split("/") if part])
+        key = href.rstrip("/")
+        # Одна страница может встречаться в меню и в подвале - берём лучшую оценку
+        previous = candidates.get(key)
+        if previous is None or score > previous[0]:
+            candidates[key] = (score, depth, position, href)
+
+    ranked = sorted(candidates.values(), key=lambda item: (-item[0], item[1], item[2]))
+    return [href for _, _, _, href in ranked[:limit]]
+
+
+def aggregate_text(pages: Iterable, max_chars: int) -> str:
+    """
+    Текст нескольких страниц сайта одним контекстом для модели:
+    по разделу на страницу (заголовок, H1, абзацы, цены), не длиннее max_chars
+    """
+    sections: List[str] = []
+    total = 0
+    for page in pages:
+        if getattr(page, "error", None):
+            continue
+        lines = [f"### {page.title or page.url}", f"URL: {page.url}"]
+        if page.h1:
+            lines.append(f"H1: {page.h1}")
+        if page.meta_description:
+            lines.append(f"Описание: {page.meta_description}")
+        lines.extend(page.paragraphs or ([page.first_paragraph] if page.first_paragraph else []))
+        if page.prices:
+            lines.append(f"Цены: {', '.join(page.prices)}")
+
+        section = "\n".join(lines)
+        remaining = max_chars - total
+        if remaining <= 0:
+            break
+        if len(section) > remaining:
+            section = section[:remaining].rstrip() + "…"
+        sections.append(section)
+        total += len(section) + 2
+    return "\n\n".join(sections)
+
+
+def crawl_budget(requested: Optional[int], default: int, maximum: int) -> int:
+    """Бюджет страниц обхода, включая стартовую"""
+    return max(1, min(requested or default, maximum))
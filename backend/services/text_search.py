@@ -0,0 +1,171 @@
+"""
+Токенизация и стемминг текста для полнотекстового поиска
+(русский Snowball стеммер без внешних зависимостей)
+"""
+import re
+from typing import Iterable, List, Optional
+
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+VOWELS = "аеиоуыэюя"
+
+# Окончания Snowball (русский). Окончания группы 1 допустимы только после "а" или "я"
+PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")
+PERFECTIVE_GERUND_2 = ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв")
+ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+    "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею"
+)
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+REFLEXIVE = ("ся", "сь")
+VERB_1 = (
+    "ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н"
+)
+VERB_2 = (
+    "ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют",
+    "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю"
+)
+NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях", "ев", "ов", "ие", "ье", "еи", "ии", "ей",
+    "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья", "а", "е", "и", "й",
+    "о", "у", "ы", "ь", "ю", "я"
+)
+SUPERLATIVE = ("ейше", "ейш")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _by_length(endings: Iterable[str]) -> List[str]:
+    return sorted(endings, key=len, reverse=True)
+
+
+PERFECTIVE_GERUND_1 = _by_length(PERFECTIVE_GERUND_1)
+PERFECTIVE_GERUND_2 = _by_length(PERFECTIVE_GERUND_2)
+ADJECTIVE = _by_length(ADJECTIVE)
+PARTICIPLE_1 = _by_length(PARTICIPLE_1)
+PARTICIPLE_2 = _by_length(PARTICIPLE_2)
+VERB_1 = _by_length(VERB_1)
+VERB_2 = _by_length(VERB_2)
+NOUN = _by_length(NOUN)
+
+
+def _regions(word: str):
+    """Позиции RV и R2 по правилам Snowball"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _strip(word: str, start: int, endings: List[str], after_a_ya: bool = False) -> Optional[str]:
+    """Удалить самое длинное окончание, целиком лежащее в области word[start:]"""
+    for ending in endings:
+        if not word.endswith(ending):
+            continue
+        cut = len(word) - len(ending)
+        if cut < start:
+            continue
+        if after_a_ya:
+            if cut - 1 < start or word[cut - 1] not in "ая":
+                continue
+        return word[:cut]
+    return None
+
+
+def _strip_any(word: str, start: int, group_1: List[str], group_2: List[str]) -> Optional[str]:
+    """Окончание из группы 1 (после а/я) или группы 2 - выбирается самое длинное"""
+    candidates = [
+        result for result in (
+            _strip(word, start, group_1, after_a_ya=True),
+            _strip(word, start, group_2)
+        )
+        if result is not None
+    ]
+    return min(candidates, key=len) if candidates else None
+
+
+def stem(word: str) -> str:
+    """Основа русского слова (Snowball). Нерусские слова возвращаются как есть"""
+    word = word.lower().replace("ё", "е")
+    if not re.search("[а-я]", word):
+        return word
+
+    rv, r2 = _regions(word)
+
+    # Шаг 1
+    result = _strip_any(word, rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if result is not None:
+        word = result
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+
+        adjective = _strip(word, rv, ADJECTIVE)
+        if adjective is not None:
+            participle = _strip_any(adjective, rv, PARTICIPLE_1, PARTICIPLE_2)
+            word = participle if participle is not None else adjective
+        else:
+            result = _strip_any(word, rv, VERB_1, VERB_2)
+            if result is None:
+                result = _strip(word, rv, NOUN)
+            if result is not None:
+                word = result
+
+    # Шаг 2
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    word = _strip(word, r2, DERIVATIONAL) or word
+
+    # Шаг 4
+    if word.endswith("нн") and len(word) - 1 >= rv:
+        word = word[:-1]
+    else:
+        superlative = _strip(word, rv, SUPERLATIVE)
+        if superlative is not None:
+            word = superlative
+            if word.endswith("нн") and len(word) - 1 >= rv:
+                word = word[:-1]
+        elif word.endswith("ь") and len(word) - 1 >= rv:
+            word = word[:-1]
+
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Разбить текст на основы слов"""
+    if not text:
+        return []
+    text = text.lower().replace("ё", "е")
+    return [stem(token) for token in TOKEN_RE.findall(text)]
+
+
+def to_document(*parts) -> str:
+    """Текст для индекса: основы слов через пробел (строки и списки строк)"""
+    tokens: List[str] = []
+    for part in parts:
+        if isinstance(part, (list, tuple)):
+            for item in part:
+                tokens.extend(tokenize(str(item)))
+        else:
+            tokens.extend(tokenize(part))
+    return " ".join(tokens)
+
+
+def to_match_query(query: str, match_all: bool = True) -> Optional[str]:
+    """Выражение FTS5 MATCH из пользовательского запроса (None - нечего искать)"""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return None
+    # Кавычки защищают от синтаксиса FTS5 в пользовательском вводе
+    return (" AND " if match_all else " OR ").join(f'"{token}"' for token in tokens)
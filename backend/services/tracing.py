@@ -0,0 +1,174 @@
+"""
+Трассировка этапов обработки запроса (спаны в формате, совместимом с OpenTelemetry)
+"""
+import json
+import os
+import re
+import secrets
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from backend.config import settings
+
+# Логгер для сервиса
+logger = logging.getLogger("competitor_monitor.tracing")
+
+SERVICE_NAME = "competitor-monitor"
+
+# W3C traceparent: версия-trace_id-span_id-флаги
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# Текущий спан и id запроса. Контекст копируется в asyncio задачи и to_thread;
+# для run_in_executor его нужно передавать явно (contextvars.copy_context)
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+class Span:
+    """Один этап обработки: имя, время начала/конца, атрибуты и статус"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+        self.status_message = ""
+        # Спан завершится не при выходе из блока, а вызовом Tracer.end (потоковый ответ)
+        self.deferred = False
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status = "ERROR"
+        self.status_message = f"{type(error).__name__}: {error}"[:500]
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Спан в виде JSON записи, близкой к OTLP/JSON"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+class Tracer:
+    """
+    Создание спанов и экспорт завершённых спанов построчно (JSON Lines)
+    в файл tracing_export_path. Файл можно передать коллектору
+    OpenTelemetry (filelog) или разбирать напрямую.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация трассировки")
+
+        self.enabled = settings.tracing_enabled
+        self.export_path = settings.tracing_export_path
+        self._lock = threading.Lock()
+        self._file = None
+        if self.enabled and self.export_path:
+            directory = os.path.dirname(self.export_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.export_path, "a", encoding="utf-8", buffering=1)
+
+        logger.info(f"  Трассировка: {'включена' if self.enabled else 'выключена'}")
+        logger.info(f"  Экспорт спанов: {self.export_path or 'нет'}")
+        logger.info("Трассировка инициализирована ✓")
+        logger.info("=" * 50)
+
+    @staticmethod
+    def parse_traceparent(header: Optional[str]):
+        """(trace_id, parent_span_id) из заголовка traceparent или (None, None)"""
+        match = TRACEPARENT_RE.match((header or "").strip().lower())
+        if not match:
+            return None, None
+        return match.group(1), match.group(2)
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+             **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Спан этапа. Вложенные спаны становятся дочерними автоматически.
+        Исключение помечает спан ошибкой и пробрасывается дальше.
+        Если внутри блока выставлен span.deferred, спан завершает Tracer.end.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        parent = current_span.get()
+        if trace_id is None:
+            if parent is not None:
+                trace_id, parent_id = parent.trace_id, parent.span_id
+            else:
+                trace_id = secrets.token_hex(16)
+
+        request_id = request_id_var.get()
+        if request_id:
+            attributes.setdefault("request.id", request_id)
+
+        span = Span(name, trace_id, parent_id, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            current_span.reset(token)
+            if not span.deferred:
+                self.end(span)
+
+    def end(self, span: Span):
+        """Завершить и экспортировать спан"""
+        span.end_ns = time.time_ns()
+        self._export(span)
+
+    def traced(self, name: str) -> Callable:
+        """Декоратор: асинхронная функция целиком выполняется в спане name"""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _export(self, span: Span):
+        if self._file is None:
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Глобальный экземпляр
+tracer = Tracer()
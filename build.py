@@ -29,6 +29,24 @@ def build():
         "--hidden-import=backend.services",
         "--hidden-import=backend.services.openai_service",
         "--hidden-import=backend.services.parser_service",
+        "--hidden-import=backend.services.driver_pool",
+        "--hidden-import=backend.services.chromedriver_resolver",
+        "--hidden-import=backend.services.collector_service",
+        "--hidden-import=backend.services.job_service",
+        "--hidden-import=backend.services.cache_service",
+        "--hidden-import=backend.services.image_service",
+        "--hidden-import=backend.services.text_search",
+        "--hidden-import=backend.services.fingerprint_service",
+        "--hidden-import=backend.services.http_fetcher",
+        "--hidden-import=backend.services.crawl_scheduler",
+        "--hidden-import=backend.services.site_crawler",
+        "--hidden-import=backend.services.batch_service",
+        "--hidden-import=backend.services.circuit_breaker",
+        "--hidden-import=backend.services.rate_limiter",
+        "--hidden-import=backend.services.metrics",
+        "--hidden-import=backend.services.tracing",
+        "--hidden-import=backend.services.scheduler_service",
+        "--hidden-import=backend.services.competitor_service",
         "--hidden-import=backend.config",
         "--hidden-import=backend.models.schemas",
         
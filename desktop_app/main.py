@@ -1,7 +1,6 @@
 import sys
 import os
 import asyncio
-import base64
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QTabWidget, QTextEdit, QPushButton, 
                              QLabel, QFileDialog, QLineEdit, QScrollArea, QMessageBox,
@@ -23,6 +22,7 @@ if __name__ == "__main__":
 
 from backend.services.openai_service import openai_service
 from backend.services.parser_service import parser_service
+from backend.services.image_service import image_service
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -208,7 +208,6 @@ class MainWindow(QMainWindow):
         try:
             with open(path, "rb") as image_file:
                 content = image_file.read()
-                image_base64 = base64.b64encode(content).decode('utf-8')
                 # Определяем mime type по расширению (простое решение)
                 ext = os.path.splitext(path)[1].lower()
                 mime_type = "image/jpeg"
@@ -216,6 +215,9 @@ class MainWindow(QMainWindow):
                 elif ext == ".webp": mime_type = "image/webp"
                 elif ext == ".gif": mime_type = "image/gif"
             
+            # Уменьшаем и пережимаем перед отправкой в модель
+            image_base64, mime_type = await image_service.encode(content, mime_type)
+            
             analysis = await openai_service.analyze_image(image_base64, mime_type)
             
             # Форматируем вывод
@@ -269,7 +271,7 @@ class MainWindow(QMainWindow):
                 pixmap = QPixmap()
                 pixmap.loadFromData(screenshot_bytes)
                 self.url_screenshot_label.setPixmap(pixmap.scaled(600, 400, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-                screenshot_base64 = parser_service.screenshot_to_base64(screenshot_bytes)
+                screenshot_base64, screenshot_mime = await image_service.encode(screenshot_bytes, "image/png")
             
             # 2. Analyze
             analysis = None
@@ -280,7 +282,8 @@ class MainWindow(QMainWindow):
                         url=url,
                         title=title,
                         h1=h1,
-                        first_paragraph=first_paragraph
+                        first_paragraph=first_paragraph,
+                        mime_type=screenshot_mime
                     )
                 else:
                     analysis = await openai_service.analyze_parsed_content(